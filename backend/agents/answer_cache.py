@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    In-memory semantic cache mapping query embeddings to final answers.
+
+    Entries are grouped by namespace (agent + document version) so answers
+    never leak across documents. Lookup is a single matmul over the
+    normalized embeddings of a namespace; eviction is LRU with a TTL.
+    """
+
+    def __init__(self, threshold: float = 0.93, max_entries: int = 1024, ttl: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: Dict[Hashable, "OrderedDict[int, tuple]"] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _evict_expired(self, bucket: "OrderedDict[int, tuple]", now: float) -> None:
+        expired = [k for k, (_, _, ts) in bucket.items() if now - ts > self.ttl]
+        for k in expired:
+            del bucket[k]
+
+    def lookup(self, namespace: Hashable, vector: Sequence[float]) -> Optional[Any]:
+        """Return the cached value for the most similar query, or None on a miss."""
+        with self._lock:
+            bucket = self._entries.get(namespace)
+            if not bucket:
+                return None
+            self._evict_expired(bucket, time.time())
+            if not bucket:
+                return None
+
+            ids = list(bucket.keys())
+            matrix = np.stack([bucket[i][0] for i in ids])
+            scores = matrix @ self._normalize(vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = ids[best]
+            bucket.move_to_end(entry_id)
+            logger.info(f"Semantic cache hit (similarity={scores[best]:.3f})")
+            return bucket[entry_id][1]
+
+    def store(self, namespace: Hashable, vector: Sequence[float], value: Any) -> None:
+        """Add an answer for the given query embedding."""
+        with self._lock:
+            bucket = self._entries.setdefault(namespace, OrderedDict())
+            bucket[self._next_id] = (self._normalize(vector), value, time.time())
+            self._next_id += 1
+            while len(bucket) > self.max_entries:
+                bucket.popitem(last=False)
+
+
+# Shared by the RAG-backed agents
+answer_cache = SemanticAnswerCache()
@@ -1,92 +1,66 @@
 from agents.states import Session, CropResearchSession, MarketAgent, WeatherAgent
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
 from pydantic import Field
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from agents.schemas import TokenTracker, QAPair
-from utils.chat import invoke_llm_langchain
-from rag.rag import RAG
+from utils.chat import invoke_llm_langchain, stream_llm_langchain
+from rag.rag import get_rag_retriever
+from agents.answer_cache import answer_cache
 import logging
+from utils.logs import setup_logging
 import warnings
 from agents.schemas import Messages
 from dotenv import load_dotenv
-from datetime import datetime
+from uuid import uuid4
 import os
-import yaml
+from utils.prompts import get_prompts
 
 
 warnings.filterwarnings("ignore")
 
-for handler in logging.root.handlers[:]:
-    logging.root.removeHandler(handler)
-
-logging.basicConfig(
-    filename="KrishiMitra.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-with open("utils/prompts.yaml", "r") as file:
-    prompts = yaml.safe_load(file)
-
-def get_crop_data(state: Session) ->  Session:
-    """
-    Get crop data for the given state.
-    """
-    logger.info(f"Fetching crop data for state: {state.id}")
-
-    query = state.messages[-1].content if state.messages else "Get crop data"
-    logger.info(f"Querying RAG with: {query}")
-
-    rag = RAG(state.pdf_path)
-    index = rag.create_db()
-    retriever = rag.create_retriever(index)
-    rag_response = rag.rag_query(query,retriever)
-    logger.info(f"RAG response: {rag_response}")
-
-    # Step 1: Get LLM response
-    messages = [
-        SystemMessage(content=prompts["Crop_prompts"]["System_message"]),
-        HumanMessage(content=query),
-    ]
-    llm_response, input_tokens, output_tokens = invoke_llm_langchain(messages)
-    llm_content = llm_response[-1].content
-    logger.info(f"LLM response: {llm_content}")
+prompts = get_prompts()
 
-    # Step 2: Refine with RAG + LLM response
-    refine_messages = [
+def _crop_messages(query, rag_response):
+    return [
         SystemMessage(content=prompts["Crop_prompts"]["System_message"]),
         HumanMessage(
-            content=f"Write a proper response using RAG response: {rag_response} "
-                    f"and LLM response: {llm_content}"
-        )
+            content=f"User query: {query}\n\n"
+                    f"Write a proper response using RAG response: {rag_response}"
+        ),
     ]
-    final_response, input_tokens2, output_tokens2 = invoke_llm_langchain(refine_messages)
-    final_content = final_response[-1].content
-    logger.info(f"Final response: {final_content}")
 
+
+def _lookup_crop_cache(state: Session, query):
+    """
+    Resolve the retriever and check the semantic answer cache for the query.
+    """
+    rag, retriever = get_rag_retriever(state.pdf_path)
+    cache_ns = ("crop", state.pdf_path, os.path.getmtime(state.pdf_path))
+    query_vector = rag.embed_model.embed_query(query)
+    cached = answer_cache.lookup(cache_ns, query_vector)
+    return rag, retriever, cache_ns, query_vector, cached
+
+
+def _record_crop_answer(state: Session, query, final_content, rag_response, input_tokens, output_tokens) -> Session:
     # Update session state
-    state.token_tracker.net_input_tokens = (state.token_tracker.net_input_tokens or 0) + input_tokens + input_tokens2
-    state.token_tracker.net_output_tokens = (state.token_tracker.net_output_tokens or 0) + output_tokens + output_tokens2
-    state.token_tracker.net_tokens = (
-        (state.token_tracker.net_input_tokens or 0) +
-        (state.token_tracker.net_output_tokens or 0)
-    )
+    state.token_tracker.add(input_tokens, output_tokens)
 
-    state.qa_pairs[query] = QAPair(
+    state.qa_pairs[uuid4().hex] = QAPair(
         query=query,
-        answer1=final_content,  # You may want to redefine QAPair to store string instead of bool
+        answer1=final_content,
         answer2=None,
-        references=[str(rag_response)]
+        references=[rag_response]
     )
 
     # Instead of overwriting with a single message
     state.chat_history.append(
         Messages(
             type="ai",
-            time=datetime.now(),
             content=final_content
         )
     )
@@ -95,6 +69,72 @@ def get_crop_data(state: Session) ->  Session:
     logger.info(f"Updated session state: {state}")
     return state
 
+
+def get_crop_data(state: Session) ->  Session:
+    """
+    Get crop data for the given state.
+    """
+    logger.info(f"Fetching crop data for state: {state.id}")
+
+    query = state.messages[-1].content if state.messages else "Get crop data"
+    logger.info(f"Querying RAG with: {query}")
+
+    rag, retriever, cache_ns, query_vector, cached = _lookup_crop_cache(state, query)
+
+    if cached is not None:
+        final_content, rag_response = cached
+        input_tokens = output_tokens = 0
+        logger.info("Answered crop query from semantic cache")
+    else:
+        # Stringify once; references and chat history share this object
+        rag_response = str(rag.rag_query(query,retriever))
+        logger.info(f"RAG response: {rag_response}")
+
+        # Single pass: answer directly from the RAG evidence
+        final_response, input_tokens, output_tokens = invoke_llm_langchain(
+            _crop_messages(query, rag_response)
+        )
+        final_content = final_response[-1].content
+        logger.info(f"Final response: {final_content}")
+        answer_cache.store(cache_ns, query_vector, (final_content, rag_response))
+
+    return _record_crop_answer(state, query, final_content, rag_response, input_tokens, output_tokens)
+
+
+def get_crop_data_stream(state: Session) -> Iterator[str]:
+    """
+    Streaming variant of get_crop_data: yields answer text as the LLM produces
+    it and records the full answer on the session once the stream finishes.
+    """
+    logger.info(f"Streaming crop data for state: {state.id}")
+
+    query = state.messages[-1].content if state.messages else "Get crop data"
+    rag, retriever, cache_ns, query_vector, cached = _lookup_crop_cache(state, query)
+
+    if cached is not None:
+        final_content, rag_response = cached
+        yield final_content
+        _record_crop_answer(state, query, final_content, rag_response, 0, 0)
+        return
+
+    # Stringify once; references and chat history share this object
+    rag_response = str(rag.rag_query(query, retriever))
+    logger.info(f"RAG response: {rag_response}")
+
+    usage = {}
+    parts = []
+    for text in stream_llm_langchain(_crop_messages(query, rag_response), usage):
+        parts.append(text)
+        yield text
+
+    final_content = "".join(parts)
+    logger.info(f"Final response: {final_content}")
+    answer_cache.store(cache_ns, query_vector, (final_content, rag_response))
+    _record_crop_answer(
+        state, query, final_content, rag_response,
+        usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+    )
+
 if __name__ == "__main__":
     # Example usage
     session = Session(
@@ -110,7 +150,6 @@ if __name__ == "__main__":
     session.chat_history.append(
         Messages(
             type="human",
-            time=datetime.now(),
             content=session.messages[-1].content
         )
     )
@@ -1,24 +1,22 @@
 import logging
-import json
+from utils.logs import setup_logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from uuid import uuid4
 from typing import Optional
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from agents.states import Session
 from agents.schemas import TokenTracker, QAPair, Messages
 from utils.chat import invoke_llm_langchain
-from rag.rag import RAG
-from utils.webs import TavilySearchTool   # <- put your TavilySearchTool in utils/tavily.py
-import yaml
-
-logging.basicConfig(
-    filename="KrishiMitra.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+from rag.rag import get_rag_retriever
+from utils.webs import TavilySearchTool, compress_results
+from utils.prompts import get_prompts
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
-with open("utils/prompts.yaml", "r") as f:
-    _prompts = yaml.safe_load(f)
+_prompts = get_prompts()
 
 DEFAULT_MARKET_SYSTEM = (
     "You are an Indian agricultural market analysis assistant. "
@@ -29,15 +27,55 @@ MARKET_SYS = (_prompts.get("Market_prompts", {}) or {}).get(
     "System_message", DEFAULT_MARKET_SYSTEM
 )
 
-# Tavily setup
-tavily_tool = TavilySearchTool(max_results=8, search_depth="advanced")
+# Tavily setup (snippets only; raw page content is never sent to the LLM)
+tavily_tool = TavilySearchTool(max_results=8, search_depth="advanced", include_raw_content=False)
+TAVILY_CONTEXT_TOKENS = 1500
+
+# Shared pool for overlapping the independent, network-bound steps of a query
+_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def _to_jsonable(result):
+    if isinstance(result, (dict, str)):
+        return result
+    if hasattr(result, "model_dump"):
+        return result.model_dump()
+    if hasattr(result, "dict"):
+        return result.dict()
+    return str(result)
+
+
+def _search_tavily(query):
+    tavily_results = tavily_tool.search(query)
+    logger.info(f"{tavily_results} results from Tavily")
+    # After calling tavily
+    if isinstance(tavily_results, list):
+        return [_to_jsonable(r) for r in tavily_results]
+    return _to_jsonable(tavily_results)
+
+
+def _has_results(results) -> bool:
+    # TavilySearchResults returns repr(exception) as a string on failure
+    # (e.g. rate limiting), and an empty list when nothing matched
+    return isinstance(results, list) and any(results)
+
+
+def _retrieve_rag(state: Session, query):
+    rag, retriever = get_rag_retriever(state.pdf_path)
+    # Stringify once; references and chat history share this object
+    return str(rag.rag_query(query, retriever))
+
 
 def get_market_data(state: Session, location: Optional[str] = None) -> Session:
     """
     Market agent with RAG + TavilySearch + LLM refine.
+    Tavily and RAG run concurrently, and the draft/refine LLM calls (which only
+    need the Tavily context) run concurrently once the search lands.
     Updates session: messages, chat_history, qa_pairs, token_tracker.
     """
     logger.info(f"[MarketAgent] Start | session_id={state.id}")
+    now = datetime.now()
+    ts = now.timestamp()
 
     # 1) Pull query
     query = state.messages[-1].content if state.messages else "Market analysis"
@@ -45,88 +83,92 @@ def get_market_data(state: Session, location: Optional[str] = None) -> Session:
         query = f"{query} | location: {location}"
     logger.info(f"[MarketAgent] Query: {query}")
 
-    # 2) Tavily search
-    tavily_results = tavily_tool.invoke_tool(query)
-    logger.info(f"{tavily_results} results from Tavily")
-    # After calling tavily
-    if isinstance(tavily_results, list):
-        safe_results = [r.dict() if hasattr(r, "dict") else str(r) for r in tavily_results]
+    # 2) Tavily search + 3) RAG retrieval, in parallel
+    tavily_future = _executor.submit(_search_tavily, query)
+    rag_future = _executor.submit(_retrieve_rag, state, query)
+
+    safe_results = tavily_future.result()
+    if _has_results(safe_results):
+        tavily_json = orjson.dumps(safe_results, option=orjson.OPT_INDENT_2).decode()
+        # Compact, token-capped view of the results for the LLM prompts
+        tavily_context = compress_results(safe_results, max_tokens=TAVILY_CONTEXT_TOKENS)
+        logger.info("[MarketAgent] Tavily results fetched")
+
+        # 4) First LLM pass + 5) refine, in parallel (the refine prompt does not use the draft)
+        messages = [
+            SystemMessage(content=MARKET_SYS),
+            HumanMessage(content=f"{query}\n\nTavily results:\n{tavily_context}"),
+        ]
+        refine_messages = [
+            SystemMessage(content=MARKET_SYS),
+            HumanMessage(
+                content=(
+                    f"Combine the evidence and produce a clear, India-specific market analysis. most recent data given {now.isoformat()} is the datetime today\n"
+                    f"Tavily search:\n{tavily_context}\n\n"
+                    # f"RAG evidence:\n{rag_response}\n\n"
+                    # f"LLM draft:\n{llm_content}"
+                )
+            ),
+        ]
+        draft_future = _executor.submit(invoke_llm_langchain, messages)
+        refine_future = _executor.submit(invoke_llm_langchain, refine_messages)
+
+        rag_response = rag_future.result()
+        logger.info("[MarketAgent] RAG response ready")
+
+        llm_response, in1, out1 = draft_future.result()
+        llm_content = llm_response[-1].content
+        logger.info("[MarketAgent] LLM draft complete")
     else:
-        safe_results = tavily_results.dict() if hasattr(tavily_results, "dict") else str(tavily_results)
-
-    tavily_json = json.dumps(safe_results, indent=2)
-    logger.info("[MarketAgent] Tavily results fetched")
-
-    # log Tavily step
-    state.chat_history.append(
-        Messages(type="search", time=datetime.now(), content=tavily_json)
-    )
-
-    # 3) RAG retrieval
-    try:
-        rag = RAG(state.pdf_path)
-        index = rag.create_db()
-        retriever = rag.create_retriever(index)
-    except TypeError:
-        rag = RAG(pdf_path=getattr(state, "pdf_path", None))
-        retriever = rag.create_retriever()
-    rag_response = rag.rag_query(query, retriever)
-    logger.info("[MarketAgent] RAG response ready")
-
-    state.chat_history.append(
-        Messages(type="rag", time=datetime.now(), content=str(rag_response))
-    )
-
-    # 4) First LLM pass
-    messages = [
-        SystemMessage(content=MARKET_SYS),
-        HumanMessage(content=f"{query}\n\nTavily results:\n{tavily_json}"),
-    ]
-    llm_response, in1, out1 = invoke_llm_langchain(messages)
-    llm_content = llm_response[-1].content
-    logger.info("[MarketAgent] LLM draft complete")
-
-    state.chat_history.append(
-        Messages(type="ai_draft", time=datetime.now(), content=llm_content)
-    )
-
-    # 5) Refine with RAG + Tavily + LLM outputs
-    refine_messages = [
-        SystemMessage(content=MARKET_SYS),
-        HumanMessage(
-            content=(
-                f"Combine the evidence and produce a clear, India-specific market analysis. most recent data given {datetime.now()} is the datetime today\n"
-                f"Tavily search:\n{tavily_json}\n\n"
-                # f"RAG evidence:\n{rag_response}\n\n"
-                # f"LLM draft:\n{llm_content}"
-            )
-        ),
-    ]
-    final_msgs, in2, out2 = invoke_llm_langchain(refine_messages)
+        # No search evidence (empty or rate-limited): skip the draft and
+        # answer from the RAG evidence alone
+        tavily_json = None
+        logger.warning("[MarketAgent] Tavily returned no results; falling back to RAG only")
+
+        rag_response = rag_future.result()
+        logger.info("[MarketAgent] RAG response ready")
+
+        refine_messages = [
+            SystemMessage(content=MARKET_SYS),
+            HumanMessage(
+                content=(
+                    f"{query}\n\nProduce a clear, India-specific market analysis. {now.isoformat()} is the datetime today\n"
+                    f"RAG evidence:\n{rag_response}\n"
+                )
+            ),
+        ]
+        refine_future = _executor.submit(invoke_llm_langchain, refine_messages)
+        llm_content, in1, out1 = None, 0, 0
+
+    final_msgs, in2, out2 = refine_future.result()
     final_content = final_msgs[-1].content
     logger.info("[MarketAgent] Final refined answer ready")
 
     # 6) Update tokens
-    state.token_tracker.net_input_tokens = (state.token_tracker.net_input_tokens or 0) + in1 + in2
-    state.token_tracker.net_output_tokens = (state.token_tracker.net_output_tokens or 0) + out1 + out2
-    state.token_tracker.net_tokens = (
-        (state.token_tracker.net_input_tokens or 0) +
-        (state.token_tracker.net_output_tokens or 0)
-    )
+    state.token_tracker.add(in1 + in2, out1 + out2)
 
-    # 7) Save Q&A
-    state.qa_pairs[query] = QAPair(
+    # 7) Save Q&A (all fields are internal, already-typed strings)
+    state.qa_pairs[uuid4().hex] = QAPair.model_construct(
         query=query,
         answer1=final_content,
         answer2=llm_content,
-        references=[str(rag_response), tavily_json],
+        references=[rag_response] if tavily_json is None else [rag_response, tavily_json],
     )
 
-    # 8) Append final AI message
+    # 8) Append final AI message, and log Tavily, RAG and draft steps in one
+    # extend (the RAG-only path has no search or draft step to log)
     state.messages.append(AIMessage(content=final_content))
-    state.chat_history.append(
-        Messages(type="ai", time=datetime.now(), content=final_content)
-    )
+    if tavily_json is None:
+        steps = [Messages(type="rag", content=rag_response, time=ts)]
+    else:
+        steps = [
+            Messages(type="search", content=tavily_json, time=ts),
+            Messages(type="rag", content=rag_response, time=ts),
+            Messages(type="ai_draft", content=llm_content, time=ts),
+        ]
+    steps.append(Messages(type="ai", content=final_content, time=ts))
+    state.chat_history.extend(steps)
+    state.response = final_content
 
     logger.info(f"[MarketAgent] Done | session_id={state.id}")
     return state
@@ -144,7 +186,7 @@ if __name__ == "__main__":
         chat_history=[]
     )
     session.chat_history.append(
-        Messages(type="human", time=datetime.now(), content=session.messages[-1].content)
+        Messages(type="human", content=session.messages[-1].content)
     )
     session = get_market_data(session, location="Maharashtra")
     print(session.chat_history[-1].content)
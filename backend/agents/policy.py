@@ -1,18 +1,20 @@
 import logging
-from datetime import datetime
-from typing import Optional
+import os
+import time
+from uuid import uuid4
+from typing import Optional, Iterator
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from agents.states import Session
 from agents.schemas import TokenTracker, QAPair, Messages
-from utils.chat import invoke_llm_langchain
-from rag.rag import RAG
-import yaml
+from utils.chat import invoke_llm_langchain, stream_llm_langchain
+from rag.rag import get_rag_retriever
+from agents.answer_cache import answer_cache
+from utils.prompts import get_prompts
 
 logger = logging.getLogger(__name__)
 
 # Load prompts (optional key -> safe fallback)
-with open("utils/prompts.yaml", "r") as f:
-    _prompts = yaml.safe_load(f)
+_prompts = get_prompts()
 
 DEFAULT_POLICY_SYSTEM = (
     "You are an assistant for Indian agricultural policy interpretation. "
@@ -24,102 +26,134 @@ POLICY_SYS = (_prompts.get("Policy_prompts", {}) or {}).get(
     "System_message", DEFAULT_POLICY_SYSTEM
 )
 
-def get_policy_data(state: Session, topic: Optional[str] = None) -> Session:
-    """
-    Policy Agent: RAG-only (no web search).
-    Flow:
-      - Read last user query (and optional topic)
-      - Retrieve with RAG
-      - First LLM pass (draft)
-      - Refine using ONLY RAG evidence + draft
-      - Update token tracker, chat history, qa_pairs, and session messages
-    """
-    logger.info(f"[PolicyAgent] Start | session_id={state.id}")
-
-    # 1) Build query
+def _build_policy_query(state: Session, topic: Optional[str]):
     user_query = state.messages[-1].content if state.messages else "Policy query"
     query = f"{user_query}"
     if topic:
         query = f"{user_query} | topic: {topic}"
-    logger.info(f"[PolicyAgent] Query: {query}")
+    return user_query, query
 
-    # 2) RAG retrieval (RAG-only)
-    try:
-        rag = RAG(state.pdf_path)         # If your RAG takes just path
-        index = rag.create_db()
-        retriever = rag.create_retriever(index)
-    except TypeError:
-        # Fallback in case constructor differs
-        rag = RAG(pdf_path=getattr(state, "pdf_path", None))
-        retriever = rag.create_retriever()
-    rag_response = rag.rag_query(query, retriever)
-    logger.info("[PolicyAgent] RAG response ready")
-
-    # Log RAG evidence to chat history
-    state.chat_history.append(
-        Messages(type="rag", time=datetime.now(), content=str(rag_response))
-    )
 
-    # 3) First LLM pass (draft) — instructed to rely only on RAG evidence
-    draft_messages = [
+def _policy_messages(user_query, topic, rag_response):
+    return [
         SystemMessage(content=POLICY_SYS),
         HumanMessage(
             content=(
                 f"User query: {user_query}\n"
                 f"Topic (optional): {topic or 'N/A'}\n\n"
-                "Using ONLY the following RAG evidence, draft a clear answer "
-                "with section/paragraph references:\n"
-                f"{rag_response}"
+                "Using ONLY the following RAG evidence, write a clear answer. "
+                "Keep it strictly grounded to the evidence, add numbered steps/clauses "
+                "if helpful and mention relevant sections.\n\n"
+                f"RAG evidence:\n{rag_response}"
             )
         ),
     ]
-    draft_llm, in1, out1 = invoke_llm_langchain(draft_messages)
-    draft_content = draft_llm[-1].content
-    logger.info("[PolicyAgent] Draft created")
 
-    state.chat_history.append(
-        Messages(type="ai_draft", time=datetime.now(), content=draft_content)
-    )
 
-    # 4) Refine strictly with RAG evidence + draft (no external data)
-    refine_messages = [
-        SystemMessage(content=POLICY_SYS),
-        HumanMessage(
-            content=(
-                "Refine the answer. Keep it strictly grounded to the RAG evidence. "
-                "Add numbered steps/clauses if helpful and mention relevant sections.\n\n"
-                f"RAG evidence:\n{rag_response}\n\n"
-                f"Draft:\n{draft_content}"
-            )
-        ),
-    ]
-    final_msgs, in2, out2 = invoke_llm_langchain(refine_messages)
-    final_content = final_msgs[-1].content
-    logger.info("[PolicyAgent] Final answer ready")
+def _lookup_policy_cache(state: Session, query):
+    rag, retriever = get_rag_retriever(state.pdf_path)
+    cache_ns = ("policy", state.pdf_path, os.path.getmtime(state.pdf_path))
+    query_vector = rag.embed_model.embed_query(query)
+    cached = answer_cache.lookup(cache_ns, query_vector)
+    return rag, retriever, cache_ns, query_vector, cached
+
 
-    # 5) Update tokens
-    state.token_tracker.net_input_tokens = (state.token_tracker.net_input_tokens or 0) + in1 + in2
-    state.token_tracker.net_output_tokens = (state.token_tracker.net_output_tokens or 0) + out1 + out2
-    state.token_tracker.net_tokens = (state.token_tracker.net_input_tokens or 0) + (state.token_tracker.net_output_tokens or 0)
+def _record_policy_answer(state: Session, query, final_content, rag_response, in1, out1) -> Session:
+    # 4) Update tokens
+    state.token_tracker.add(in1, out1)
 
-    # 6) Save Q&A (ensure QAPair.answer1/answer2 are Optional[str] in your schema)
-    state.qa_pairs[query] = QAPair(
+    # 5) Save Q&A
+    state.qa_pairs[uuid4().hex] = QAPair(
         query=query,
         answer1=final_content,
-        answer2=draft_content,
-        references=[str(rag_response)],
+        answer2=None,
+        references=[rag_response],
     )
 
-    # 7) Append AI message + chat history
+    # 6) Append AI message + chat history (RAG evidence and answer in one batch)
     state.messages.append(AIMessage(content=final_content))
-    state.chat_history.append(
-        Messages(type="ai", time=datetime.now(), content=final_content)
-    )
+    now = time.time()
+    state.chat_history.extend([
+        Messages(type="rag", content=rag_response, time=now),
+        Messages(type="ai", content=final_content, time=now),
+    ])
+    state.response = final_content
 
     logger.info(f"[PolicyAgent] Done | session_id={state.id}")
     return state
 
 
+def get_policy_data(state: Session, topic: Optional[str] = None) -> Session:
+    """
+    Policy Agent: RAG-only (no web search).
+    Flow:
+      - Read last user query (and optional topic)
+      - Retrieve with RAG
+      - Single LLM pass grounded ONLY in the RAG evidence
+      - Update token tracker, chat history, qa_pairs, and session messages
+    """
+    logger.info(f"[PolicyAgent] Start | session_id={state.id}")
+
+    # 1) Build query
+    user_query, query = _build_policy_query(state, topic)
+    logger.info(f"[PolicyAgent] Query: {query}")
+
+    # 2) RAG retrieval (RAG-only), short-circuited by the semantic answer cache
+    rag, retriever, cache_ns, query_vector, cached = _lookup_policy_cache(state, query)
+
+    if cached is not None:
+        final_content, rag_response = cached
+        in1 = out1 = 0
+        logger.info("[PolicyAgent] Answered from semantic cache")
+    else:
+        # Stringify once; references and chat history share this object
+        rag_response = str(rag.rag_query(query, retriever))
+        logger.info("[PolicyAgent] RAG response ready")
+
+        # 3) Single grounded LLM pass over the RAG evidence
+        final_msgs, in1, out1 = invoke_llm_langchain(
+            _policy_messages(user_query, topic, rag_response)
+        )
+        final_content = final_msgs[-1].content
+        logger.info("[PolicyAgent] Final answer ready")
+        answer_cache.store(cache_ns, query_vector, (final_content, rag_response))
+
+    return _record_policy_answer(state, query, final_content, rag_response, in1, out1)
+
+
+def get_policy_data_stream(state: Session, topic: Optional[str] = None) -> Iterator[str]:
+    """
+    Streaming variant of get_policy_data: yields answer text as it is generated
+    and updates the session once the stream finishes.
+    """
+    logger.info(f"[PolicyAgent] Stream start | session_id={state.id}")
+
+    user_query, query = _build_policy_query(state, topic)
+    rag, retriever, cache_ns, query_vector, cached = _lookup_policy_cache(state, query)
+
+    if cached is not None:
+        final_content, rag_response = cached
+        yield final_content
+        _record_policy_answer(state, query, final_content, rag_response, 0, 0)
+        return
+
+    # Stringify once; references and chat history share this object
+    rag_response = str(rag.rag_query(query, retriever))
+
+    usage = {}
+    parts = []
+    for text in stream_llm_langchain(_policy_messages(user_query, topic, rag_response), usage):
+        parts.append(text)
+        yield text
+
+    final_content = "".join(parts)
+    answer_cache.store(cache_ns, query_vector, (final_content, rag_response))
+    _record_policy_answer(
+        state, query, final_content, rag_response,
+        usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+    )
+
+
 # ----------------- Example run -----------------
 if __name__ == "__main__":
 
@@ -133,7 +167,7 @@ if __name__ == "__main__":
     )
     # Log the human message
     session.chat_history.append(
-        Messages(type="human", time=datetime.now(), content=session.messages[-1].content)
+        Messages(type="human", content=session.messages[-1].content)
     )
 
     # Optional: set session.pdf_path to your policy PDF(s) location as required by RAG
@@ -0,0 +1,68 @@
+import logging
+import re
+import threading
+from typing import Callable, Optional, Sequence
+
+from cachetools import LRUCache
+
+from agents.answer_cache import SemanticAnswerCache
+
+logger = logging.getLogger(__name__)
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    return _WS.sub(" ", text.strip().lower())
+
+
+class RoutingCache:
+    """
+    Two-tier cache from user query to agent label.
+
+    Tier 1 is an exact LRU over the whitespace/case-normalized query; tier 2
+    is a semantic lookup over MiniLM query embeddings, so paraphrases of a
+    routed query skip the router LLM too.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], Sequence[float]],
+        threshold: float = 0.85,
+        max_exact: int = 10_000,
+        max_semantic: int = 2048,
+        ttl: float = 24 * 3600,
+    ):
+        self._embed_fn = embed_fn
+        self._exact = LRUCache(maxsize=max_exact)
+        self._lock = threading.Lock()
+        self._semantic = SemanticAnswerCache(threshold=threshold, max_entries=max_semantic, ttl=ttl)
+
+    def get(self, query: str):
+        """
+        Return (label, key, vector). label is None on a miss; pass key and
+        vector back to put() so the query is not normalized/embedded twice.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            label = self._exact.get(key)
+        if label is not None:
+            return label, key, None
+
+        try:
+            vector = self._embed_fn(key)
+        except Exception:
+            logger.exception("Routing cache embedding failed")
+            return None, key, None
+
+        label = self._semantic.lookup("route", vector)
+        if label is not None:
+            with self._lock:
+                self._exact[key] = label
+        return label, key, vector
+
+    def put(self, key: str, vector: Optional[Sequence[float]], label: str) -> None:
+        with self._lock:
+            self._exact[key] = label
+        if vector is not None:
+            self._semantic.store("route", vector, label)
@@ -1,21 +1,39 @@
+import time as _time
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field
-from typing import List, Any, Dict, Sequence, Optional
-from datetime import datetime
+from typing import List, Any, Dict, Sequence, Optional, NamedTuple
 
 class TokenTracker(BaseModel):
-    net_input_tokens: int = Field(None, description="Number of input tokens")
-    net_output_tokens: int = Field(None, description="Number of output tokens")
-    net_tokens: int = Field(None, description="Number of tokens")
+    net_input_tokens: int = Field(0, description="Number of input tokens")
+    net_output_tokens: int = Field(0, description="Number of output tokens")
+    net_tokens: int = Field(0, description="Number of tokens")
+
+    def add(self, input_tokens: int, output_tokens: int) -> None:
+        """Accumulate usage from one or more LLM calls."""
+        self.net_input_tokens += input_tokens
+        self.net_output_tokens += output_tokens
+        self.net_tokens = self.net_input_tokens + self.net_output_tokens
 
 class QAPair(BaseModel):
     query: str
-    answer1: Optional[str] = Field(None, description="Primary answer string")
-    answer2: Optional[str] = Field(None, description="Secondary/comparison answer string")
-    references: List[str] = Field(default_factory=list, description="List of references")
+    answer1: Optional[str] = None  # Primary answer string
+    answer2: Optional[str] = None  # Secondary/comparison answer string
+    references: List[str] = Field(default_factory=list)
+
+
+class Turn(NamedTuple):
+    """One human/AI turn of the client-facing chat history (a tuple, not a dict)."""
+    type: str
+    content: str
 
 
-class Messages(BaseModel):
-    time: datetime = Field(None, description="Timestamp of the message")
-    type: str = Field(None, description="Type of the message, e.g., 'human', 'ai'")
-    content: str = Field(None, description="Content of the message")
+@dataclass(slots=True, frozen=True)
+class Messages:
+    """
+    Chat-history entry. A plain slotted dataclass rather than a BaseModel since
+    it is built on every agent step from already-trusted values.
+    """
+    type: str  # Type of the message, e.g., 'human', 'ai'
+    content: str
+    time: float = field(default_factory=_time.time)  # epoch seconds
    
\ No newline at end of file
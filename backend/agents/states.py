@@ -3,7 +3,7 @@ from typing import Optional, Annotated, Sequence
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 from typing import Dict, Any, List
-from agents.schemas import TokenTracker, QAPair, Messages
+from agents.schemas import TokenTracker, QAPair, Messages, Turn
 
 
 # ---------------- Session Schema (yours + routing/response) ----------------
@@ -27,7 +27,7 @@ class Session(BaseModel):
         default_factory=TokenTracker, description="Token tracker for the session"
     )
     qa_pairs: Dict[str, QAPair] = Field(
-        default_factory=dict, description="Dictionary of QA pairs in the session"
+        default_factory=dict, description="QA pairs in the session, keyed by a unique id per answer"
     )
     chat_history: List[Messages] = Field(
         default_factory=list, description="Chat history for the session"
@@ -40,6 +40,9 @@ class Session(BaseModel):
     response: Optional[str] = Field(
         default=None, description="Final response text from the selected agent"
     )
+    display_history: List[Turn] = Field(
+        default_factory=list, description="Human/AI turns as returned to the client, appended as they happen"
+    )
 
 
 class CropResearchSession(Session):
@@ -1,28 +1,87 @@
 import logging
-from datetime import datetime
+import threading
+from uuid import uuid4
 from typing import Optional, Dict
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 from agents.states import Session
 from agents.schemas import TokenTracker, QAPair, Messages
+from utils import location as location_utils
 from utils.location import get_user_location
 
 logger = logging.getLogger(__name__)
 
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+WEATHER_CACHE_TTL = 300  # seconds; current conditions don't change faster than this
+LOCATION_CACHE_TTL = 900  # seconds; a session rarely moves within this window
+
+# Shared keep-alive session so repeat calls skip DNS + TLS setup
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=2, backoff_factor=0.2),
+    ),
+)
+
+# (rounded lat, rounded lon) -> response json
+_weather_cache = TTLCache(maxsize=1024, ttl=WEATHER_CACHE_TTL)
+_weather_lock = threading.Lock()
+
+# session id -> last IP-based location. Kept here rather than on the Session:
+# LangGraph nodes work on a copy of the state, so writes to it are lost
+_location_cache = TTLCache(maxsize=10_000, ttl=LOCATION_CACHE_TTL)
+_location_lock = threading.Lock()
+
 
 def fetch_weather(lat: float, lon: float) -> Dict:
     """
     Call Open-Meteo API for current weather.
     Docs: https://open-meteo.com/
     """
-    url = (
-        f"https://api.open-meteo.com/v1/forecast"
-        f"?latitude={lat}&longitude={lon}&current_weather=true"
+    key = (round(lat, 2), round(lon, 2))
+    with _weather_lock:
+        cached = _weather_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = _SESSION.get(
+        OPEN_METEO_URL,
+        params={"latitude": lat, "longitude": lon, "current_weather": "true"},
+        timeout=10,
     )
-    response = requests.get(url, timeout=10)
     response.raise_for_status()
-    return response.json()
+    data = response.json()
+    with _weather_lock:
+        _weather_cache[key] = data
+    return data
+
+
+def get_session_location(state: Session) -> Dict:
+    """
+    Return the user's location, reusing the session's last IP lookup while it
+    is fresh. GPS fixes are already local, so only IP lookups are cached.
+    """
+    # A GPS fix (possibly newer than the cached IP lookup) always wins
+    if location_utils.last_gps_location:
+        return get_user_location()
+
+    with _location_lock:
+        cached = _location_cache.get(state.id)
+    if cached is not None:
+        return cached
+
+    location_info = get_user_location()
+    if location_info.get("source") == "ip":
+        with _location_lock:
+            _location_cache[state.id] = location_info
+    return location_info
 
 
 def get_weather_data(state: Session, topic: Optional[str] = None) -> Session:
@@ -39,13 +98,14 @@ def get_weather_data(state: Session, topic: Optional[str] = None) -> Session:
     logger.info(f"[WeatherAgent] User query: {user_query}")
 
     # 1) Location
-    location_info = get_user_location()
+    location_info = get_session_location(state)
     if "error" in location_info:
         final_content = f"Could not determine your location: {location_info['error']}"
         state.messages.append(AIMessage(content=final_content))
         state.chat_history.append(
-            Messages(type="ai", time=datetime.now(), content=final_content)
+            Messages(type="ai", content=final_content)
         )
+        state.response = final_content
         return state
 
     lat, lon = location_info["latitude"], location_info["longitude"]
@@ -71,7 +131,7 @@ def get_weather_data(state: Session, topic: Optional[str] = None) -> Session:
 
     # 3) Update session
     # Save to QAPair (no LLM here, so answer1 = final, answer2 = None)
-    state.qa_pairs[user_query] = QAPair(
+    state.qa_pairs[uuid4().hex] = QAPair(
         query=user_query,
         answer1=final_content,
         answer2=None,
@@ -81,8 +141,9 @@ def get_weather_data(state: Session, topic: Optional[str] = None) -> Session:
     # Append AI message
     state.messages.append(AIMessage(content=final_content))
     state.chat_history.append(
-        Messages(type="ai", time=datetime.now(), content=final_content)
+        Messages(type="ai", content=final_content)
     )
+    state.response = final_content
 
     logger.info(f"[WeatherAgent] Done | session_id={state.id}")
     return state
@@ -100,7 +161,7 @@ if __name__ == "__main__":
     )
     # Log human message
     session.chat_history.append(
-        Messages(type="human", time=datetime.now(), content=session.messages[-1].content)
+        Messages(type="human", content=session.messages[-1].content)
     )
 
     session = get_weather_data(session)
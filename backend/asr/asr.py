@@ -1,12 +1,23 @@
 import os
+import logging
+import re
+import asyncio
 import time
+import atexit
+import hashlib
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, List
 import assemblyai as aai
+import diskcache
+from cachetools import LRUCache
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
-from typing import Dict, Any
-from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 # =========================
 # Config & Constants
@@ -19,6 +30,8 @@ if not ASSEMBLY_KEY:
 
 aai.settings.api_key = ASSEMBLY_KEY
 transcriber = aai.Transcriber()
+# Immutable per-process config; built once instead of on every transcription
+_ASR_CFG = aai.TranscriptionConfig(language_detection=True)
 
 FLORES_MAP = {
     "en": "eng_Latn",
@@ -41,6 +54,89 @@ FLORES_MAP = {
 NLLB_BASE = "https://winstxnhdw-nllb-api.hf.space"
 NLLB_TRANSLATE = f"{NLLB_BASE}/api/v4/translator"
 
+# One keep-alive session for all NLLB calls so multi-chunk translations reuse
+# the TCP/TLS connection to the HF Space instead of re-handshaking per chunk
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+atexit.register(_HTTP.close)
+
+# Chunks of a long text are independent requests; translate them concurrently
+_TRANSLATE_POOL = ThreadPoolExecutor(max_workers=8)
+
+# Translations keyed by (source, target, blake2b(text)): in-process LRU in
+# front of a size-bounded on-disk cache shared across workers and restarts
+NLLB_CACHE_DIR = os.getenv("NLLB_CACHE_DIR", "./nllb_cache")
+NLLB_CACHE_SIZE_LIMIT = 256 * 2**20
+_MEM_CACHE = LRUCache(maxsize=4096)
+_MEM_LOCK = threading.Lock()
+_DISK_CACHE = diskcache.Cache(NLLB_CACHE_DIR, size_limit=NLLB_CACHE_SIZE_LIMIT)
+atexit.register(_DISK_CACHE.close)
+
+
+def _translation_key(text: str, source: str, target: str) -> tuple:
+    return (source, target, hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest())
+
+
+def _get_cached_translation(key: tuple) -> Optional[str]:
+    with _MEM_LOCK:
+        hit = _MEM_CACHE.get(key)
+    if hit is None:
+        hit = _DISK_CACHE.get(key)
+        if hit is not None:
+            with _MEM_LOCK:
+                _MEM_CACHE[key] = hit
+    return hit
+
+
+def _set_cached_translation(key: tuple, value: str) -> None:
+    # Failed calls return "", which must not be cached
+    if not value:
+        return
+    with _MEM_LOCK:
+        _MEM_CACHE[key] = value
+    _DISK_CACHE[key] = value
+
+
+# Sentence boundaries for Latin and Indic scripts (danda / double danda)
+_SENT_SPLIT = re.compile(r"(?<=[.!?\u0964\u0965])\s+")
+
+
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    Greedily pack whole sentences into chunks of at most max_chars
+    (a single longer sentence becomes its own chunk).
+    """
+    parts, start, cur = [], 0, 0
+    sents = _SENT_SPLIT.split(text)
+    for i, sent in enumerate(sents):
+        add = len(sent) + 1
+        if cur + add > max_chars and i > start:
+            parts.append(" ".join(sents[start:i]))
+            start, cur = i, 0
+        cur += add
+    if start < len(sents):
+        parts.append(" ".join(sents[start:]))
+    return parts
+
+
+# Below this share of non-ASCII letters the text is treated as English
+_NON_ASCII_MAX_SHARE = 0.05
+
+
+def _is_effectively_english(text: str) -> bool:
+    """
+    True for pure-ASCII text or text whose letters are almost all ASCII (e.g.
+    a detector returning 'hi' for English with a stray native word). A share
+    rather than a count, so short native-script replies still get translated.
+    """
+    if text.isascii():
+        return True
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return True
+    non_ascii = sum(1 for c in letters if not c.isascii())
+    return non_ascii / len(letters) < _NON_ASCII_MAX_SHARE
+
 
 # =========================
 # Step 1: Transcribe + Detect Language
@@ -50,8 +146,7 @@ def transcribe_audio_with_detection(audio_path: str) -> Dict[str, Any]:
     Transcribe 'audio_path' and detect language via AssemblyAI.
     Returns: dict with keys: text, lang_code, transcript (raw object).
     """
-    config = aai.TranscriptionConfig(language_detection=True)
-    transcript = transcriber.transcribe(audio_path, config)
+    transcript = transcriber.transcribe(audio_path, _ASR_CFG)
     if transcript.error:
         raise RuntimeError(f"Transcription error: {transcript.error}")
 
@@ -60,6 +155,46 @@ def transcribe_audio_with_detection(audio_path: str) -> Dict[str, Any]:
     return {"text": text, "lang_code": lang_code, "transcript": transcript}
 
 
+@lru_cache(maxsize=32)
+def _asr_config_for(lang_code: str) -> aai.TranscriptionConfig:
+    return aai.TranscriptionConfig(language_code=lang_code)
+
+
+def transcribe_audio(audio_path: str, lang_code: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Transcribe 'audio_path', skipping AssemblyAI language detection when the
+    caller already knows the language. Without 'lang_code' this is the same
+    as transcribe_audio_with_detection.
+    Returns: dict with keys: text, lang_code, transcript (raw object).
+    """
+    if not lang_code:
+        return transcribe_audio_with_detection(audio_path)
+
+    transcript = transcriber.transcribe(audio_path, _asr_config_for(lang_code))
+    if transcript.error:
+        raise RuntimeError(f"Transcription error: {transcript.error}")
+
+    text = (transcript.text or "").strip()
+    return {"text": text, "lang_code": lang_code, "transcript": transcript}
+
+
+async def transcribe_many_async(paths: List[str], max_concurrency: int = 4) -> List[Dict[str, Any]]:
+    """
+    Transcribe several audio files concurrently, with at most max_concurrency
+    uploads in flight (AssemblyAI rate limits, default executor size).
+    Each blocking AssemblyAI upload/poll runs in a worker thread, so the
+    poll loops overlap instead of running one after another.
+    Results are returned in the same order as 'paths'.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _one(path):
+        async with semaphore:
+            return await asyncio.to_thread(transcribe_audio_with_detection, path)
+
+    return await asyncio.gather(*(_one(p) for p in paths))
+
+
 # =========================
 # Step 2: Indic -> English (NLLB)
 # =========================
@@ -74,18 +209,24 @@ def translate_text_nllb_api_indic2en(indic_text: str, source_lang_code: str,
         "source": source,
         "target": FLORES_MAP["en"],  # always English target
     }
+    key = _translation_key(indic_text, source, FLORES_MAP["en"])
+    cached = _get_cached_translation(key)
+    if cached is not None:
+        return cached
+
     for attempt in range(retries + 1):
         try:
-            r = requests.get(NLLB_TRANSLATE, params=params, timeout=timeout)
+            r = _HTTP.get(NLLB_TRANSLATE, params=params, timeout=timeout)
             r.raise_for_status()
             data = r.json()
-            out = data.get("text") or data.get("result") or ""
-            return (out or "").strip()
+            out = (data.get("text") or data.get("result") or "").strip()
+            _set_cached_translation(key, out)
+            return out
         except Exception as e:
             if attempt < retries:
                 time.sleep(1.5 * (attempt + 1))
                 continue
-            print(f"[ERROR] NLLB API (Indic->EN) failed: {e}")
+            logger.error(f"NLLB API (Indic->EN) failed: {e}")
             return ""
 
 
@@ -98,23 +239,21 @@ def translate_chunked_nllb_indic2en(indic_text: str, source_lang_code: str,
     if len(text) <= max_chars:
         return translate_text_nllb_api_indic2en(text, source_lang_code)
 
-    parts, buf, cur = [], [], 0
-    for sent in text.split(". "):
-        add = (sent + ". ").strip()
-        if cur + len(add) > max_chars and buf:
-            parts.append(" ".join(buf).strip())
-            buf = [add]
-            cur = len(add)
-        else:
-            buf.append(add)
-            cur += len(add)
-    if buf:
-        parts.append(" ".join(buf).strip())
-
-    out = []
-    for p in parts:
-        out.append(translate_text_nllb_api_indic2en(p, source_lang_code))
-    return " ".join(out).strip()
+    # Whole-text cache hit skips chunking and every per-chunk call
+    key = _translation_key(text, FLORES_MAP.get(source_lang_code, source_lang_code), FLORES_MAP["en"])
+    cached = _get_cached_translation(key)
+    if cached is not None:
+        return cached
+
+    parts = split_into_chunks(text, max_chars)
+
+    out = list(_TRANSLATE_POOL.map(
+        lambda p: translate_text_nllb_api_indic2en(p, source_lang_code), parts
+    ))
+    result = " ".join(out).strip()
+    if all(out):
+        _set_cached_translation(key, result)
+    return result
 
 
 # =========================
@@ -131,18 +270,24 @@ def translate_text_nllb_api(english_text: str, target_lang_code: str,
         "source": FLORES_MAP["en"],
         "target": target
     }
+    key = _translation_key(english_text, FLORES_MAP["en"], target)
+    cached = _get_cached_translation(key)
+    if cached is not None:
+        return cached
+
     for attempt in range(retries + 1):
         try:
-            r = requests.get(NLLB_TRANSLATE, params=params, timeout=timeout)
+            r = _HTTP.get(NLLB_TRANSLATE, params=params, timeout=timeout)
             r.raise_for_status()
             data = r.json()
-            out = data.get("text") or data.get("result") or ""
-            return (out or "").strip()
+            out = (data.get("text") or data.get("result") or "").strip()
+            _set_cached_translation(key, out)
+            return out
         except Exception as e:
             if attempt < retries:
                 time.sleep(1.5 * (attempt + 1))
                 continue
-            print(f"[ERROR] NLLB API (EN->Indic) failed: {e}")
+            logger.error(f"NLLB API (EN->Indic) failed: {e}")
             return ""
 
 
@@ -155,23 +300,21 @@ def translate_chunked_nllb(english_text: str, target_lang_code: str,
     if len(text) <= max_chars:
         return translate_text_nllb_api(text, target_lang_code)
 
-    parts, buf, cur = [], [], 0
-    for sent in text.split(". "):
-        add = (sent + ". ").strip()
-        if cur + len(add) > max_chars and buf:
-            parts.append(" ".join(buf).strip())
-            buf = [add]
-            cur = len(add)
-        else:
-            buf.append(add)
-            cur += len(add)
-    if buf:
-        parts.append(" ".join(buf).strip())
-
-    out = []
-    for p in parts:
-        out.append(translate_text_nllb_api(p, target_lang_code))
-    return " ".join(out).strip()
+    # Whole-text cache hit skips chunking and every per-chunk call
+    key = _translation_key(text, FLORES_MAP["en"], FLORES_MAP.get(target_lang_code, target_lang_code))
+    cached = _get_cached_translation(key)
+    if cached is not None:
+        return cached
+
+    parts = split_into_chunks(text, max_chars)
+
+    out = list(_TRANSLATE_POOL.map(
+        lambda p: translate_text_nllb_api(p, target_lang_code), parts
+    ))
+    result = " ".join(out).strip()
+    if all(out):
+        _set_cached_translation(key, result)
+    return result
 
 
 # =========================
@@ -197,18 +340,18 @@ def text_to_speech_elevenlabs(
             voice_id=voice_id,
             model_id=model_id,
         )
-        with open(filename, "wb") as f:
-            for chunk in audio_stream:
-                if isinstance(chunk, bytes):
-                    f.write(chunk)
+        # 1 MiB buffer: many small stream chunks become a few large write() calls
+        with open(filename, "wb", buffering=1 << 20) as f:
+            f.writelines(c for c in audio_stream if isinstance(c, bytes))
         return filename
     except Exception as e:
-        print(f"[ERROR] ElevenLabs TTS failed: {e}")
+        logger.error(f"ElevenLabs TTS failed: {e}")
         return None
 
-def audio_to_english_transcript(audio_path: str) -> Dict[str, Any]:
+def audio_to_english_transcript(audio_path: str, lang_code: Optional[str] = None) -> Dict[str, Any]:
     """
     Transcribe an audio file and return English transcript.
+    Pass 'lang_code' when the spoken language is known to skip detection.
     
     Returns dict:
         {
@@ -217,16 +360,16 @@ def audio_to_english_transcript(audio_path: str) -> Dict[str, Any]:
             "english_text": str
         }
     """
-    # Step 1: Transcribe + detect language
-    result = transcribe_audio_with_detection(audio_path)
+    # Step 1: Transcribe (+ detect language unless given)
+    result = transcribe_audio(audio_path, lang_code)
     original_text = result["text"]
     lang_code = result["lang_code"]
 
     # Step 2: Translate if necessary
     if not original_text:
         english_text = ""
-    elif lang_code in ["en", "unknown", None, ""]:
-        # Either English or undetected: assume English
+    elif lang_code in ["en", "unknown", None, ""] or _is_effectively_english(original_text):
+        # English, undetected, or Latin-script text: no translation needed
         english_text = original_text
     else:
         # Translate from Indic (or any detected language) -> English
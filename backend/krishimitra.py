@@ -1,8 +1,10 @@
 import os
 import logging
+from utils.logs import setup_logging
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Sequence, Annotated
-import json
 from datetime import datetime
+from uuid import uuid4
 from pydantic import BaseModel, Field, ConfigDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
@@ -16,14 +18,54 @@ from agents.policy import get_policy_data
 from agents.states import Session
 import re
 from utils.chat import invoke_llm_langchain
+from agents.routing_cache import RoutingCache
+from rag.rag import get_embed_model
 
-logging.basicConfig(
-    filename="KrishiMitra.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+AGENT_LABELS = {"CropResearch", "MarketAgent", "WeatherAgent", "PolicyAgent", "FallbackAgent"}
+
+# Keywords that the router rules below already settle on their own,
+# compiled into one alternation with a named group per label so a single
+# scan finds every hit. Kept deliberately narrow: anything that depends on
+# the rules' conditions (a single named crop, current local weather) or on
+# agents the router doesn't offer still goes to the LLM router.
+_ROUTE_KEYWORDS = {
+    "PolicyAgent": [r"scheme", r"schemes", r"yojana", r"subsid(?:y|ies)", r"pm[- ]?kisan", r"pmfby", r"government policy"],
+    "WeatherAgent": [r"weather (?:today|now|forecast)", r"will it rain"],
+    "FallbackAgent": [r"loans?", r"interest rates?"],
+}
+_ROUTE_PATTERN = re.compile(
+    "|".join(
+        rf"(?P<{label}>\b(?:{'|'.join(words)})\b)" for label, words in _ROUTE_KEYWORDS.items()
+    ),
+    re.IGNORECASE,
+)
+
+
+def keyword_route(query: str) -> Optional[str]:
+    """Agent label if every keyword hit agrees on one agent, else None."""
+    labels = {m.lastgroup for m in _ROUTE_PATTERN.finditer(query)}
+    return labels.pop() if len(labels) == 1 else None
+
+
+# Query -> agent label; repeated or paraphrased queries skip the router LLM
+routing_cache = RoutingCache(lambda text: get_embed_model().embed_query(text))
+
+
+# Routing is a one-label classification: use the smallest model and cap decode
+ROUTER_MODEL = os.getenv("KM_ROUTER_MODEL", "llama-3.1-8b-instant")
+ROUTER_MAX_TOKENS = 8
+
+# Static router instructions; built once and shared by every routing call
+ROUTE_SYSTEM_MSG = HumanMessage(content="""You are a router. 
+Decide which agent should handle the latest user query.
+Options: CropResearch, WeatherAgent, PolicyAgent.
+If none clearly fits, return FallbackAgent. for things like loan rates and stuff do fallback. also note that CropResearch proviedes data about a single crop in a given format so use it only when the user asks about a single crop by name.
+and WeatherAgent provides weather data for your current location so don't call it for questions like "What seed variety suits this unpredictable weather? use Fallback in that scenario".
+Return ONLY the agent name (no explanation).""")
+
 
 def route_query(state: Session) -> Dict[str, Any]:
     """
@@ -32,92 +74,98 @@ def route_query(state: Session) -> Dict[str, Any]:
     if not state.messages:
         return {"next": "FallbackAgent"}  # no input → fallback
 
-    system_prompt = """You are a router. 
-Decide which agent should handle the latest user query.
-Options: CropResearch, WeatherAgent, PolicyAgent.
-If none clearly fits, return FallbackAgent. for things like loan rates and stuff do fallback. also note that CropResearch proviedes data about a single crop in a given format so use it only when the user asks about a single crop by name.
-and WeatherAgent provides weather data for your current location so don't call it for questions like "What seed variety suits this unpredictable weather? use Fallback in that scenario".
-Return ONLY the agent name (no explanation)."""
+    query = state.messages[-1].content
+    nxt = keyword_route(query)
+    if nxt is not None:
+        logger.info(f"Routing to: {nxt} (keyword)")
+        return {"next": nxt}
+
+    cached, cache_key, query_vector = routing_cache.get(query)
+    if cached is not None:
+        logger.info(f"Routing to: {cached} (cached)")
+        return {"next": cached}
 
     routing_messages = [
-        HumanMessage(content=system_prompt),
-        HumanMessage(content=f"User query: {state.messages[-1].content}")
+        ROUTE_SYSTEM_MSG,
+        HumanMessage(content=f"User query: {query}")
     ]
 
     try:
-        msgs, _, _ = invoke_llm_langchain(routing_messages)
+        msgs, _, _ = invoke_llm_langchain(
+            routing_messages, model=ROUTER_MODEL, temperature=0, max_tokens=ROUTER_MAX_TOKENS
+        )
         nxt = msgs[-1].content.strip()
     except Exception as e:
         logger.exception("Routing LLM failed, using fallback")
-        nxt = "FallbackAgent"
+        # Transient failure: don't remember this query as a fallback
+        return {"next": "FallbackAgent"}
 
-    if nxt not in {"CropResearch", "MarketAgent", "WeatherAgent", "PolicyAgent", "FallbackAgent"}:
+    if nxt not in AGENT_LABELS:
         nxt = "FallbackAgent"
+    routing_cache.put(cache_key, query_vector, nxt)
 
     logger.info(f"Routing to: {nxt}")
     return {"next": nxt}
 
 
+FALLBACK_SYSTEM_MSG = SystemMessage(
+    content="Answer in the indian context, be concise and clear. also don't state your knowledge cutoff date."
+)
+
 
 def fallback_node(state: Session) -> Dict[str, Any]:
     """Fallback: directly call LLM if no other agent fits."""
     try:
-        state.messages.append(
-            SystemMessage(content="Answer in the indian context, be concise and clear. also don't state your knowledge cutoff date."))
-        msgs, _, _ = invoke_llm_langchain(state.messages)
+        # The instruction only goes to the LLM; it is not kept in session history
+        msgs, _, _ = invoke_llm_langchain([*state.messages, FALLBACK_SYSTEM_MSG])
         out = msgs[-1].content
     except Exception as e:
         logger.exception("Error in fallback_node")
         out = f"FallbackAgent error: {e}"
 
-    msgs = list(state.messages) + [AIMessage(content=out)]
-    return {"response": out, "messages": msgs}
+    # Only the new message; the add_messages reducer appends it to state
+    return {"response": out, "messages": [AIMessage(content=out)]}
 
 
 def crop_node(state: Session) -> Dict[str, Any]:
     """Run crop research agent and append an AI message."""
     try:
-        # print("DEBUG: Session PDF path:", state.pdf_path)
-        out = get_crop_data(state)
-        # print("DEBUG: Crop output:", out)
+        out = get_crop_data(state).response
     except Exception as e:
         logger.exception("Error in crop_node")
         out = f"CropResearch error: {e}"
-        print(out)
-    msgs = list(state.messages) + [AIMessage(content=str(out))]
-    return {"response": str(out), "messages": msgs}
+    return {"response": out, "messages": [AIMessage(content=out)]}
 
 def market_node(state: Session) -> Dict[str, Any]:
     """Run market agent and append an AI message."""
     try:
-        out = get_market_data(state)
+        out = get_market_data(state).response
     except Exception as e:
         logger.exception("Error in market_node")
         out = f"MarketAgent error: {e}"
-    msgs = list(state.messages) + [AIMessage(content=str(out))]
-    return {"response": str(out), "messages": msgs}
+    return {"response": out, "messages": [AIMessage(content=out)]}
 
 def weather_node(state: Session) -> Dict[str, Any]:
     """Run weather agent and append an AI message."""
     try:
-        out = get_weather_data(state)
+        out = get_weather_data(state).response
     except Exception as e:
         logger.exception("Error in weather_node")
         out = f"WeatherAgent error: {e}"
-    msgs = list(state.messages) + [AIMessage(content=str(out))]
-    return {"response": str(out), "messages": msgs}
+    return {"response": out, "messages": [AIMessage(content=out)]}
 
 def policy_node(state: Session) -> Dict[str, Any]:
     """Run policy agent and append an AI message."""
     try:
-        out = get_policy_data(state)
+        out = get_policy_data(state).response
     except Exception as e:
         logger.exception("Error in policy_node")
         out = f"PolicyAgent error: {e}"
-    msgs = list(state.messages) + [AIMessage(content=str(out))]
-    return {"response": str(out), "messages": msgs}
+    return {"response": out, "messages": [AIMessage(content=out)]}
 
+@lru_cache(maxsize=1)
 def KrishiMitra_pipeline():
+    """Build and compile the routing graph once; later calls reuse it."""
     builder = StateGraph(Session)
 
     builder.add_node("route_query", route_query)
@@ -151,7 +199,7 @@ def KrishiMitra_pipeline():
 
 def run_chatbot():
     graph = KrishiMitra_pipeline()
-    session = Session()
+    session = Session(id=uuid4().hex)
     session.pdf_path = "Dataset/KrishiMitra.docx"  # ensure PDF path is set
 
     print("🌱 Welcome to KrishiMitra! (type 'quit' to exit)\n")
@@ -168,16 +216,9 @@ def run_chatbot():
         # Invoke graph
         result = graph.invoke(session)
 
-        # Print AI response directly
-        ai_response = result.get("response", "No response")
-        ai_response_str = ai_response  # your string
-        ai_response_json = json.loads(ai_response_str)
-
-        # Get the last AI message
-        last_ai = next((m for m in reversed(ai_response_json["chat_history"]) if m["type"] == "ai"), None)
-
-        if last_ai:
-            print(f"🤖 KM: {last_ai['content']}\n")
+        # Nodes return the agent's answer text directly
+        ai_response = result.get("response") or "No response"
+        print(f"🤖 KM: {ai_response}\n")
 
 if __name__ == "__main__":
    run_chatbot()
@@ -4,20 +4,113 @@ import pytesseract
 from PIL import Image
 import warnings
 import logging
+from utils.logs import setup_logging
 import os
 import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 warnings.filterwarnings("ignore")
-logging.basicConfig(
-    filename='KrishiMitra.log',
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# One OpenMP thread per tesseract process: parallelism comes from the page
+# pool, and multi-threaded tesseract oversubscribes cores alongside it.
+# Inherited by tesseract subprocesses and by spawned pool workers.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Bump whenever a change alters parsed output, so cached text is re-parsed
+PARSER_VERSION = 2
+
+# Pages with less extractable text than this are OCR'd
+OCR_MIN_CHARS = 50
+# Below this many pages, process start-up costs more than it saves
+PARALLEL_MIN_PAGES = 8
+# Pages are rendered for OCR at 150 DPI grayscale: sharper than the 72 DPI
+# default for tesseract, at one byte per pixel instead of three
+OCR_DPI = 150
+OCR_MATRIX = fitz.Matrix(OCR_DPI / 72, OCR_DPI / 72)
+
+
+def _ocr_pixmap(pix, ocr_engine):
+    # Wrap the raw samples directly; no PNG encode/decode round trip
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    return ocr_engine.image_to_string(img)
+
+
+def _batch_ocr(image_paths):
+    """
+    OCR several page images with a single tesseract run: tesseract reads a
+    .txt input as a list of image paths and separates pages with form feeds.
+    """
+    list_path = os.path.join(os.path.dirname(image_paths[0]), "images.txt")
+    with open(list_path, "w") as f:
+        f.write("\n".join(image_paths))
+    pages = pytesseract.image_to_string(list_path).split("\f")
+    if len(pages) < len(image_paths):
+        raise ValueError(f"expected {len(image_paths)} OCR pages, got {len(pages)}")
+    return pages[:len(image_paths)]
+
+
+def _parse_page_range(pdf_path, start, end, ocr_engine=pytesseract):
+    """
+    Extract text for pages [start, end) of the PDF, falling back to OCR on
+    near-empty pages. Opens its own document so it can run in a worker
+    process; returns one (text, ocr_applied, error) tuple per page.
+    """
+    results = []
+    # (index into results, page_num, image path) for pages awaiting batch OCR
+    pending = []
+    batch = ocr_engine is pytesseract
+    with fitz.open(pdf_path) as doc, tempfile.TemporaryDirectory(prefix="km_ocr_") as tmp:
+        for page_num in range(start, end):
+            page = doc.load_page(page_num)
+
+            # Try to extract text directly
+            text = page.get_text()
+            # With no embedded images (e.g. a blank page) OCR can't find
+            # anything, so skip the render and tesseract run
+            if len(text.strip()) >= OCR_MIN_CHARS or not page.get_images(full=False):
+                results.append((text, False, None))
+                continue
+
+            try:
+                pix = page.get_pixmap(matrix=OCR_MATRIX, colorspace=fitz.csGRAY, alpha=False)
+                if batch:
+                    # Rendered now, OCR'd together after the loop. Saved as
+                    # raw PGM: tesseract reads PNM, and this skips the zlib
+                    # encode/decode a PNG would cost
+                    path = os.path.join(tmp, f"{page_num}.pgm")
+                    pix.save(path)
+                    pending.append((len(results), page_num, path))
+                    results.append(None)
+                else:
+                    results.append((_ocr_pixmap(pix, ocr_engine), True, None))
+            except Exception as e:
+                results.append((f"[OCR ERROR ON PAGE {page_num+1}]", False, str(e)))
+
+        if pending:
+            try:
+                texts = _batch_ocr([path for _, _, path in pending])
+                for (idx, _, _), ocr_text in zip(pending, texts):
+                    results[idx] = (ocr_text, True, None)
+            except Exception:
+                # Fall back to one tesseract call per saved page image
+                for idx, page_num, path in pending:
+                    try:
+                        results[idx] = (ocr_engine.image_to_string(path), True, None)
+                    except Exception as e:
+                        results[idx] = (f"[OCR ERROR ON PAGE {page_num+1}]", False, str(e))
+    return results
+
+
 class PDFParser:
     """
     A class to parse PDF files and extract text, with selective OCR application.
-    OCR is only used when necessary and no images are saved to disk.
+    OCR is only used when necessary; page images for OCR only ever live in a
+    temporary directory that is removed after parsing.
     """
     
     def __init__(self, pdf_path, ocr_engine=pytesseract):
@@ -42,7 +135,7 @@ class PDFParser:
     def parse(self):
         """
         Parse the PDF file and extract text, applying OCR only when necessary.
-        No images are saved locally during processing.
+        No images are kept after processing.
         
         Returns:
             str: The extracted text
@@ -51,51 +144,48 @@ class PDFParser:
         start_time = time.time()
         
         try:
-            doc = fitz.open(self.pdf_path)
-            total_pages = len(doc)
+            with fitz.open(self.pdf_path) as doc:
+                total_pages = len(doc)
             logger.info(f"Successfully opened PDF with {total_pages} pages")
-            
-            full_text = []
+
+            # Text extraction holds the GIL and OCR is CPU-bound, so large
+            # documents are split into contiguous page ranges across processes
+            # (the default pytesseract engine only; custom engines run inline)
+            num_workers = min(os.cpu_count() or 1, 4)
+            if self.ocr_engine is pytesseract and num_workers > 1 and total_pages >= PARALLEL_MIN_PAGES:
+                step = -(-total_pages // num_workers)
+                bounds = [(i, min(i + step, total_pages)) for i in range(0, total_pages, step)]
+                # spawn, not fork: the server process has live threads and locks
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=len(bounds), mp_context=ctx) as pool:
+                    chunks = pool.map(
+                        _parse_page_range,
+                        [self.pdf_path] * len(bounds),
+                        [b[0] for b in bounds],
+                        [b[1] for b in bounds],
+                    )
+                    pages = [page for chunk in chunks for page in chunk]
+                logger.info(f"Parsed {total_pages} pages across {len(bounds)} processes")
+            else:
+                pages = _parse_page_range(self.pdf_path, 0, total_pages, self.ocr_engine)
+
+            # Pages are written straight into one buffer rather than collected
+            # in a list and joined
+            buf = io.StringIO()
             ocr_applied_count = 0
-            
-            for page_num in range(total_pages):
-                logger.debug(f"Processing page {page_num+1}/{total_pages}")
-                page = doc.load_page(page_num)
-                
-                # Try to extract text directly
-                text = page.get_text()
-                text_length = len(text.strip())
-                logger.debug(f"Page {page_num+1}: Extracted {text_length} characters")
-                
-                # Apply OCR if needed
-                if text_length < 50:
-                    logger.info(f"Applying OCR to page {page_num+1} (only {text_length} characters found)")
-                    ocr_start_time = time.time()
-                    
-                    try:
-                        pix = page.get_pixmap()
-                        img_bytes = pix.tobytes("png")
-                        img = Image.open(io.BytesIO(img_bytes))
-                        ocr_text = self.ocr_engine.image_to_string(img)
-                        ocr_length = len(ocr_text.strip())
-                        
-                        logger.info(f"OCR completed for page {page_num+1}: extracted {ocr_length} characters in {time.time() - ocr_start_time:.2f} seconds")
-                        full_text.append(ocr_text)
-                        ocr_applied_count += 1
-                    except Exception as e:
-                        logger.error(f"OCR failed for page {page_num+1}: {str(e)}")
-                        full_text.append(f"[OCR ERROR ON PAGE {page_num+1}]")
-                else:
-                    logger.debug(f"Using direct text extraction for page {page_num+1}")
-                    full_text.append(text)
-            
-            # Store total pages and OCR count before closing the document
+            for page_num, (text, ocr_applied, error) in enumerate(pages):
+                if error:
+                    logger.error(f"OCR failed for page {page_num+1}: {error}")
+                elif ocr_applied:
+                    logger.info(f"OCR applied to page {page_num+1}: extracted {len(text.strip())} characters")
+                    ocr_applied_count += 1
+                if page_num:
+                    buf.write("\n\n")
+                buf.write(text)
+
             logger.info(f"PDF processing completed. Applied OCR to {ocr_applied_count} of {total_pages} pages")
-            
-            # Now close the document
-            doc.close()
-            
-            self.extracted_text = "\n\n".join(full_text)
+
+            self.extracted_text = buf.getvalue()
             self.has_parsed = True
             
             total_time = time.time() - start_time
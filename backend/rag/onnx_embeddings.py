@@ -0,0 +1,63 @@
+import logging
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# int8 export published alongside the PyTorch weights on the model repo; the
+# AVX2 variant runs on any x86-64 server (override for AVX-512/VNNI or ARM)
+DEFAULT_ONNX_FILE = os.getenv("KM_ONNX_EMBED_FILE", "onnx/model_quint8_avx2.onnx")
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from a quantized ONNX export run on onnxruntime's CPU
+    provider. Reproduces the sentence-transformers MiniLM pipeline: mean
+    pooling over the attention mask, then L2 normalization.
+    """
+
+    def __init__(self, model_name: str, onnx_file: str = DEFAULT_ONNX_FILE,
+                 batch_size: int = 64, max_length: int = 256):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            hf_hub_download(model_name, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+        self.max_length = max_length
+        logger.info(f"Loaded ONNX embedding model {model_name}/{onnx_file}")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = [None] * len(texts)
+        # Longest first so each batch pads to similar lengths
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, vec in zip(idx, pooled):
+                vectors[i] = vec.tolist()
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
@@ -1,56 +1,199 @@
 import warnings
 import logging
+from utils.logs import setup_logging
 import uuid
+import asyncio
+import atexit
+import hashlib
 import os
+import threading
+from functools import lru_cache
 from typing import List, Dict, Any
 from dotenv import load_dotenv
+import diskcache
+from cachetools import LRUCache, TTLCache
 from langchain_core.messages import HumanMessage
-from utils.chat import invoke_llm_langchain
-import yaml
+from utils.chat import invoke_llm_langchain, ainvoke_llm_langchain
+from utils.prompts import get_prompts, PROMPTS_PATH
 from llama_index.core import VectorStoreIndex
 from llama_index.core import Settings
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.core.storage.storage_context import StorageContext
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from llama_index.core.schema import Document
-from parser.parser import PDFParser
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from llama_index.core.schema import Document, MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from parser.parser import PDFParser, PARSER_VERSION, OCR_DPI, OCR_MIN_CHARS
+from rag.onnx_embeddings import OnnxEmbeddings
 from llama_index.core.node_parser import SentenceSplitter
 import chromadb
 
 warnings.filterwarnings("ignore")
 
-for handler in logging.root.handlers[:]:
-    logging.root.removeHandler(handler)
-logging.basicConfig(
-    filename="KrishiMitra.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_CACHE_DIR = "./embedding_cache"
+EMBED_BATCH_SIZE = 64
+# Parsed document text, keyed by path + mtime, shared across processes/restarts
+PARSE_CACHE_DIR = "./parse_cache"
+# Set to keep vector collections on disk (keyed by document content);
+# by default they live in memory for the life of the process
+CHROMA_PERSIST_DIR = os.getenv("KM_CHROMA_PERSIST_DIR")
+# HNSW index settings for each collection. search_ef trades recall for
+# latency (~40 low latency, ~200 high recall)
+HNSW_SEARCH_EF = int(os.getenv("KM_HNSW_SEARCH_EF", 64))
+HNSW_CONSTRUCTION_EF = 200
+HNSW_M = 32
+# Opt-in int8 ONNX embedder (~4x faster on CPU); vectors differ slightly from
+# the FP32 model, so they are cached under their own namespace
+USE_ONNX_EMBEDDINGS = os.getenv("KM_ONNX_EMBEDDINGS") == "1"
+
+# rag_query results keyed by (document version, embedder, prompt, top_k,
+# query): in-process cache in front of an on-disk cache shared across
+# workers/restarts. Both expire, and the disk cache is size-bounded
+QUERY_CACHE_DIR = os.getenv("KM_QUERY_CACHE_DIR", "./query_cache")
+QUERY_CACHE_TTL = 24 * 3600
+QUERY_CACHE_SIZE_LIMIT = 256 * 2**20
+_QUERY_MEM_CACHE = TTLCache(maxsize=256, ttl=QUERY_CACHE_TTL)
+_QUERY_MEM_LOCK = threading.Lock()
+_QUERY_DISK_CACHE = diskcache.Cache(QUERY_CACHE_DIR, size_limit=QUERY_CACHE_SIZE_LIMIT)
+atexit.register(_QUERY_DISK_CACHE.close)
+
+# (pdf_path, mtime, top_k) -> (RAG, retriever); rebuilding the index
+# re-embeds every chunk. Bounded, and only the latest version of a path is
+# kept. _RETRIEVER_LOCK serializes builds; lookups only take the cache lock
+RETRIEVER_CACHE_SIZE = 8
+
+
+class _RetrieverCache(LRUCache):
+    """LRU of (RAG, retriever) pairs that frees each evicted collection."""
+
+    def popitem(self):
+        key, (rag, retriever) = super().popitem()
+        rag.drop_collection()
+        return key, (rag, retriever)
+
+
+_RETRIEVER_CACHE = _RetrieverCache(maxsize=RETRIEVER_CACHE_SIZE)
+_RETRIEVER_CACHE_LOCK = threading.Lock()
+_RETRIEVER_LOCK = threading.Lock()
+
+
+def _configure_torch_threads():
+    """
+    Pin torch's intra-op pool for MiniLM encoding: torch's default (one
+    thread per core, hyperthreads included) oversubscribes alongside the
+    server's worker threads; 4-8 threads is the sweet spot for this model.
+    """
+    import torch
+
+    torch.set_num_threads(int(os.getenv("KM_TORCH_THREADS", min(os.cpu_count() or 1, 8))))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before torch runs its first parallel op
+        pass
+
+
+@lru_cache(maxsize=1)
+def get_embed_model():
+    """Process-wide MiniLM embedder, shared by every RAG instance and the router."""
+    if USE_ONNX_EMBEDDINGS:
+        try:
+            return OnnxEmbeddings(EMBED_MODEL_NAME, batch_size=EMBED_BATCH_SIZE)
+        except Exception:
+            logger.exception("ONNX embedder unavailable, falling back to PyTorch")
+    _configure_torch_threads()
+    return HuggingFaceEmbeddings(
+        model_name=EMBED_MODEL_NAME, encode_kwargs={"batch_size": EMBED_BATCH_SIZE}
+    )
+
+
+def embed_cache_namespace(model) -> str:
+    if isinstance(model, OnnxEmbeddings):
+        return f"{EMBED_MODEL_NAME}-onnx-int8"
+    return EMBED_MODEL_NAME
+
+
+@lru_cache(maxsize=4)
+def _parse_pdf(pdf_path, mtime):
+    """
+    Parsed text for one version of a document. Parsing (OCR included) runs
+    once per file version; later instances and processes read the cached text.
+    """
+    # Parser version and OCR settings are part of the key, so text parsed
+    # by an older parser is not served after it changes
+    key = f"{pdf_path}:{mtime}:{PARSER_VERSION}:{OCR_DPI}:{OCR_MIN_CHARS}"
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    cache_file = os.path.join(PARSE_CACHE_DIR, f"{digest}.txt")
+    if os.path.exists(cache_file):
+        logger.info(f"Loading parsed text for {pdf_path} from {cache_file}")
+        with open(cache_file, encoding="utf-8") as f:
+            return f.read()
+
+    text = PDFParser(pdf_path).parse()
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    # Write-then-rename so a concurrent reader never sees a partial file
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, cache_file)
+    return text
+
 
 class RAG:
     def __init__(self, pdf_path):
         logger.info(f"Initializing RAG with PDF: {pdf_path}")
-        self.parser = PDFParser(pdf_path)
-        self.text = self.parser.parse()
+        # (abspath, mtime) of the document version this instance indexes
+        self.source = (os.path.abspath(pdf_path), os.path.getmtime(pdf_path))
+        self.text = _parse_pdf(*self.source)
         logger.info(f"Successfully loaded document text")
-        self.embed_model = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        logger.info(
-            "Initialized embedding model: sentence-transformers/all-MiniLM-L6-v2"
+        # Chunk vectors are persisted by content hash, so re-indexing only
+        # embeds chunks that changed (in one batch per call)
+        base_model = get_embed_model()
+        self.embed_model = CacheBackedEmbeddings.from_bytes_store(
+            base_model,
+            LocalFileStore(EMBED_CACHE_DIR),
+            namespace=embed_cache_namespace(base_model),
         )
+        logger.info(f"Initialized embedding model: {EMBED_MODEL_NAME}")
         Settings.embed_model = self.embed_model
         Settings.chunk_size = 1000
         Settings.chunk_overlap = 100
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        prompts_path = os.path.join(project_root, "utils", "prompts.yaml")
-        with open(prompts_path, "r", encoding="utf-8") as file:
-            self.prompts = yaml.safe_load(file)["RAG_prompts"]
-        logger.info(f"Loaded prompts from {prompts_path}")
+        self.prompts = get_prompts()["RAG_prompts"]
+        logger.info(f"Loaded prompts from {PROMPTS_PATH}")
+        # Set by create_db; used to free an in-memory collection
+        self.chroma_client = None
+        self.collection_name = None
+        self.query_cache_prefix = hashlib.blake2b(
+            "\0".join(
+                [embed_cache_namespace(base_model), self.prompts["human_message"], self.text]
+            ).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+
+    def _query_cache_key(self, query_text, retriever):
+        # top_k of the retriever actually queried, not the last one created
+        top_k = getattr(retriever, "similarity_top_k", None)
+        return (*self.source, self.query_cache_prefix, top_k, query_text.strip())
+
+    def _get_cached_query(self, key):
+        with _QUERY_MEM_LOCK:
+            hit = _QUERY_MEM_CACHE.get(key)
+        if hit is None:
+            hit = _QUERY_DISK_CACHE.get(key)
+            if hit is not None:
+                with _QUERY_MEM_LOCK:
+                    _QUERY_MEM_CACHE[key] = hit
+        return hit
+
+    def _set_cached_query(self, key, result):
+        with _QUERY_MEM_LOCK:
+            _QUERY_MEM_CACHE[key] = result
+        _QUERY_DISK_CACHE.set(key, result, expire=QUERY_CACHE_TTL)
 
     def prepare_documents_from_text(self, text):
         logger.info("Preparing documents from text")
@@ -91,25 +234,101 @@ class RAG:
         logger.info(f"Created {len(llama_nodes)} total nodes from documents")
         return llama_nodes
 
+    def embed_nodes(self, nodes):
+        """
+        Embed every node in a single encode call and attach the vectors, so
+        the index does not embed them itself in small batches. The encoder
+        length-sorts the whole list, which keeps per-batch padding minimal.
+        """
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        vectors = self.embed_model.embed_documents(texts)
+        for node, vector in zip(nodes, vectors):
+            node.embedding = vector
+        logger.info(f"Embedded {len(nodes)} nodes in one batch")
+
+    def add_nodes_to_collection(self, chroma_client, chroma_collection, nodes):
+        """
+        Insert pre-embedded nodes with as few collection.add calls as Chroma's
+        batch limit allows. Metadata is serialized the way ChromaVectorStore
+        does it, so the index can rebuild nodes at query time.
+        """
+        ids = [node.node_id for node in nodes]
+        embeddings = [node.embedding for node in nodes]
+        documents = [node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes]
+        metadatas = [
+            node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+            for node in nodes
+        ]
+        batch_size = chroma_client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            chroma_collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+            )
+        logger.info(f"Added {len(ids)} nodes to Chroma collection")
 
-    def create_db(self):
+    def create_db(self, search_ef=HNSW_SEARCH_EF):
         logger.info("Creating vector database from documents")
 
-        documents = self.prepare_documents_from_text(self.text)
-        llama_nodes = self.process_documents(documents)
-        collection_name = f"Randomness_{uuid.uuid4().hex[:8]}"
-        chroma_client = chromadb.PersistentClient(path="./chroma_db")
-        chroma_collection = chroma_client.get_or_create_collection(collection_name)
+        if CHROMA_PERSIST_DIR:
+            # Vectors depend on the embedder and HNSW settings are fixed at
+            # creation, so both are part of the collection identity
+            key = (
+                f"{embed_cache_namespace(get_embed_model())}:"
+                f"{HNSW_M}:{HNSW_CONSTRUCTION_EF}:{search_ef}:{self.text}"
+            )
+            digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+            collection_name = f"doc_{digest}"
+            chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+        else:
+            collection_name = f"Randomness_{uuid.uuid4().hex[:8]}"
+            chroma_client = chromadb.EphemeralClient()
+        chroma_collection = chroma_client.get_or_create_collection(
+            collection_name,
+            metadata={
+                "hnsw:space": "cosine",
+                "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+                "hnsw:search_ef": search_ef,
+                "hnsw:M": HNSW_M,
+            },
+        )
 
         logger.info(f"Created Chroma collection: {collection_name}")
+        self.chroma_client = chroma_client
+        self.collection_name = collection_name
 
+        if chroma_collection.count():
+            logger.info(f"Reusing {chroma_collection.count()} persisted nodes")
+        else:
+            documents = self.prepare_documents_from_text(self.text)
+            llama_nodes = self.process_documents(documents)
+            self.embed_nodes(llama_nodes)
+            self.add_nodes_to_collection(chroma_client, chroma_collection, llama_nodes)
         vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        index = VectorStoreIndex(nodes=llama_nodes, storage_context=storage_context)
+        index = VectorStoreIndex.from_vector_store(
+            vector_store, embed_model=self.embed_model
+        )
 
-        logger.info(f"Successfully created vector index with {len(llama_nodes)} nodes")
+        logger.info(f"Successfully created vector index with {chroma_collection.count()} nodes")
         return index
 
+    def drop_collection(self):
+        """
+        Delete this instance's in-memory collection. Persisted collections are
+        kept, since other processes and restarts reuse them.
+        """
+        if self.chroma_client is None or CHROMA_PERSIST_DIR:
+            return
+        try:
+            self.chroma_client.delete_collection(self.collection_name)
+            logger.info(f"Deleted Chroma collection: {self.collection_name}")
+        except Exception:
+            logger.warning(f"Could not delete Chroma collection {self.collection_name}", exc_info=True)
+        self.chroma_client = None
+
     def create_retriever(self, index, similarity_top_k=5):
 
         logger.info(f"Creating retriever with similarity_top_k={similarity_top_k}")
@@ -117,13 +336,7 @@ class RAG:
         retriever = index.as_retriever(similarity_top_k=similarity_top_k)
         return retriever
 
-    def rag_query(self, query_text, retriever):
-        query_id = str(uuid.uuid4())
-        logger.info(f"Processing query: {query_id} - '{query_text}'")
-
-        retrieval_result = retriever.retrieve(query_text)
-        logger.info(f"Retrieved {len(retrieval_result)} relevant nodes")
-
+    def _build_messages(self, query_text, retrieval_result):
         context_parts = []
         source_documents = []
 
@@ -146,14 +359,15 @@ class RAG:
         logger.debug(
             f"Generated prompt with context from {len(context_parts)} documents"
         )
-        messages = [HumanMessage(content=prompt)]
-        logger.info("Invoking LLM for response generation")
-        updated_messages, input_tokens, output_tokens = invoke_llm_langchain(messages)
+        return [HumanMessage(content=prompt)], source_documents
+
+    def _finish_query(self, cache_key, query_id, query_text, source_documents, llm_output):
+        updated_messages, input_tokens, output_tokens = llm_output
         logger.info(
             f"Generated response: {input_tokens} input tokens, {output_tokens} output tokens"
         )
 
-        return {
+        result = {
             "query_id": query_id,
             "query": query_text,
             "result": updated_messages[-1].content,
@@ -161,6 +375,97 @@ class RAG:
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
         }
+        self._set_cached_query(cache_key, result)
+        return result
+
+    def _cached_result(self, cache_key, query_id):
+        cached = self._get_cached_query(cache_key)
+        if cached is None:
+            return None
+        logger.info(f"Query cache hit for {query_id}")
+        return {**cached, "query_id": query_id, "input_tokens": 0, "output_tokens": 0}
+
+    def rag_query(self, query_text, retriever):
+        query_id = str(uuid.uuid4())
+        logger.info(f"Processing query: {query_id} - '{query_text}'")
+
+        cache_key = self._query_cache_key(query_text, retriever)
+        cached = self._cached_result(cache_key, query_id)
+        if cached is not None:
+            return cached
+
+        retrieval_result = retriever.retrieve(query_text)
+        logger.info(f"Retrieved {len(retrieval_result)} relevant nodes")
+
+        messages, source_documents = self._build_messages(query_text, retrieval_result)
+        logger.info("Invoking LLM for response generation")
+        llm_output = invoke_llm_langchain(messages)
+        return self._finish_query(cache_key, query_id, query_text, source_documents, llm_output)
+
+    async def arag_query(self, query_text, retriever):
+        """
+        Async rag_query: the (sync) retriever runs in a worker thread and the
+        LLM call uses the native async client.
+        """
+        query_id = str(uuid.uuid4())
+        logger.info(f"Processing query: {query_id} - '{query_text}'")
+
+        cache_key = self._query_cache_key(query_text, retriever)
+        cached = self._cached_result(cache_key, query_id)
+        if cached is not None:
+            return cached
+
+        retrieval_result = await asyncio.to_thread(retriever.retrieve, query_text)
+        logger.info(f"Retrieved {len(retrieval_result)} relevant nodes")
+
+        messages, source_documents = self._build_messages(query_text, retrieval_result)
+        logger.info("Invoking LLM for response generation")
+        llm_output = await ainvoke_llm_langchain(messages)
+        return self._finish_query(cache_key, query_id, query_text, source_documents, llm_output)
+
+    async def rag_query_batch(self, queries, retriever, max_concurrency=10):
+        """
+        Answer several queries concurrently so their retrieval and Groq
+        latency overlap. Results are returned in input order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(query_text):
+            async with semaphore:
+                return await self.arag_query(query_text, retriever)
+
+        return await asyncio.gather(*(_one(q) for q in queries))
+
+
+def get_rag_retriever(pdf_path, similarity_top_k=5):
+    """
+    Return a (RAG, retriever) pair for pdf_path, building the index only once
+    per file version.
+    """
+    abspath = os.path.abspath(pdf_path)
+    key = (abspath, os.path.getmtime(pdf_path), similarity_top_k)
+    with _RETRIEVER_CACHE_LOCK:
+        cached = _RETRIEVER_CACHE.get(key)
+    if cached is not None:
+        logger.info(f"Reusing cached retriever for {pdf_path}")
+        return cached
+
+    with _RETRIEVER_LOCK:
+        with _RETRIEVER_CACHE_LOCK:
+            cached = _RETRIEVER_CACHE.get(key)
+        if cached is None:
+            rag = RAG(pdf_path)
+            index = rag.create_db()
+            retriever = rag.create_retriever(index, similarity_top_k=similarity_top_k)
+            cached = (rag, retriever)
+            with _RETRIEVER_CACHE_LOCK:
+                # Older versions of this file will never be asked for again
+                stale = [k for k in _RETRIEVER_CACHE if k[0] == abspath and k[1] != key[1]]
+                for k in stale:
+                    logger.info(f"Dropping retriever for outdated {pdf_path}")
+                    _RETRIEVER_CACHE.pop(k)[0].drop_collection()
+                _RETRIEVER_CACHE[key] = cached
+    return cached
 
 
 if __name__ == "__main__":
@@ -1,17 +1,22 @@
 import os
 import re
-import json
+import asyncio
+import orjson
+import shutil
+import threading
+from cachetools import TTLCache
 from typing import List, Dict, Any, Optional
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 from agents.states import Session
+from agents.schemas import Turn
 from krishimitra import KrishiMitra_pipeline
 from asr.asr import audio_to_english_transcript, english_to_original_language
-from utils.vision import ask_vlm  # VLM function
-from utils.chat import invoke_llm_langchain  # <-- refine query before graph
+from utils.vision import ask_vlm_async  # VLM function
+from utils.chat import extract_json
 
 # ===============================
 # Initialize FastAPI & Middleware
@@ -29,7 +34,12 @@ app.add_middleware(
 # Initialize Graph & Session Store
 # ===============================
 graph = KrishiMitra_pipeline()
-sessions: Dict[str, Session] = {}
+# Bounded by active users: idle sessions expire after an hour
+sessions: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+sessions_lock = threading.RLock()
+# Last 10 user/AI message pairs are kept; older ones only lengthen every prompt
+MAX_SESSION_MESSAGES = 20
+MAX_DISPLAY_HISTORY = 40
 
 # ===============================
 # Response Models
@@ -38,6 +48,63 @@ class ChatResponse(BaseModel):
     response: str
     chat_history: Optional[List[Dict[str, Any]]] = None
 
+# Pleasantries answered without routing or any LLM call
+_GREETING_REPLY = "Namaste! I'm KrishiMitra. Ask me about crops, weather, market prices or government schemes."
+CANNED_REPLIES = {
+    **dict.fromkeys(("hi", "hello", "hey", "namaste", "good morning", "good evening"), _GREETING_REPLY),
+    **dict.fromkeys(("thanks", "thank you", "thanks a lot", "thank you so much"), "You're welcome! Happy farming."),
+    **dict.fromkeys(("bye", "goodbye", "see you"), "Goodbye! Come back any time."),
+    **dict.fromkeys(("ok", "okay"), "Let me know if there's anything else I can help with."),
+}
+
+
+# What may surround a JSON answer: whitespace and an optional code fence
+_JSON_PREFIX = re.compile(r"\s*(?:```(?:json)?\s*)?", re.IGNORECASE)
+_JSON_SUFFIX = re.compile(r"\s*(?:```\s*)?")
+
+
+def _json_answer(text: str) -> Optional[str]:
+    """
+    The JSON object in text if that object is the whole answer (optionally
+    fenced); None for prose, even prose that quotes a {...} example.
+    """
+    obj = extract_json(text)
+    if obj is None:
+        return None
+    start = text.find(obj)
+    if _JSON_PREFIX.fullmatch(text[:start]) and _JSON_SUFFIX.fullmatch(text[start + len(obj):]):
+        return obj
+    return None
+
+
+def _canned_reply(message: str) -> Optional[str]:
+    if len(message) > 32:
+        return None
+    return CANNED_REPLIES.get(message.lower().strip(" .!?"))
+
+
+def _get_or_create_session(user_id: str) -> Session:
+    """Single lookup on the hot path; a new session is created on a miss."""
+    with sessions_lock:
+        session = sessions.get(user_id)
+        if session is None:
+            session = Session(id=user_id)
+            session.pdf_path = "Dataset/KrishiMitra.docx"
+        # Re-set on every request so active sessions do not expire
+        sessions[user_id] = session
+    return session
+
+
+def _history_payload(session: Session) -> List[Dict[str, Any]]:
+    return [turn._asdict() for turn in session.display_history]
+
+
+def _save_upload(file: UploadFile, path: str) -> None:
+    """Copy an upload to disk in 1 MiB chunks instead of reading it whole."""
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file.file, f, length=1 << 20)
+
+
 # ===============================
 # /chat_dynamic Endpoint
 # ===============================
@@ -50,12 +117,7 @@ async def chat_dynamic(
     # ----------------------
     # Get or create session
     # ----------------------
-    if user_id not in sessions:
-        session = Session()
-        session.pdf_path = "Dataset/KrishiMitra.docx"
-        sessions[user_id] = session
-    else:
-        session = sessions[user_id]
+    session = _get_or_create_session(user_id)
 
     original_language = "en"  # default
 
@@ -64,12 +126,11 @@ async def chat_dynamic(
     # ----------------------
     if file and file.content_type.startswith("image"):
         img_path = f"temp_{user_id}_{file.filename}"
-        with open(img_path, "wb") as f:
-            f.write(await file.read())
+        await asyncio.to_thread(_save_upload, file, img_path)
 
         fixed_prompt = "Tell me the name of the crop in the image and ,Is there any anomalies in the shown crop? format your answer as crop: <crop_name>, anomalies: <(which is the disease name)>."
         try:
-            ai_response = ask_vlm(img_path, fixed_prompt)
+            ai_response = await ask_vlm_async(img_path, fixed_prompt)
         except Exception as e:
             ai_response = f"Error calling VLM: {e}"
 
@@ -81,10 +142,9 @@ async def chat_dynamic(
     # ----------------------
     if file and file.content_type.startswith("audio"):
         audio_path = f"temp_{user_id}_{file.filename}"
-        with open(audio_path, "wb") as f:
-            f.write(await file.read())
+        await asyncio.to_thread(_save_upload, file, audio_path)
 
-        asr_result = audio_to_english_transcript(audio_path)
+        asr_result = await asyncio.to_thread(audio_to_english_transcript, audio_path)
         os.remove(audio_path)
 
         message = asr_result["english_text"]
@@ -93,52 +153,46 @@ async def chat_dynamic(
             original_language = detected_lang
 
     # ----------------------
-    # Text input -> Refine Query -> Graph
-    # ----------------------
+    # Text input -> Graph
     # ----------------------
-    # Text input -> Refine Query -> Graph
-    # ----------------------
-    if message:
-        try:
-            refine_prompt = HumanMessage(
-                content= message
-            )
-
-            refined_messages, in_tok, out_tok = invoke_llm_langchain([refine_prompt])
-
-            # Get the refined query (last AI message content)
-            refined_message = refined_messages[-1].content
-            refined_message = message
-
-        except Exception as e:
-            refined_message = message 
-
-        # Save refined query to session
-        session.messages.append(HumanMessage(content=refined_message))
+    canned = _canned_reply(message) if message else None
+    if canned is not None:
+        session.display_history.append(Turn("human", message))
+        session.display_history.append(Turn("ai", canned))
+        del session.display_history[:-MAX_DISPLAY_HISTORY]
+        if original_language != "en":
+            canned = await asyncio.to_thread(english_to_original_language, canned, original_language)
+        return ChatResponse(response=canned, chat_history=_history_payload(session))
 
+    if message:
+        session.messages.append(HumanMessage(content=message))
+        session.display_history.append(Turn("human", message))
 
     # ----------------------
     # Run KrishiMitra Graph
     # ----------------------
-    result = graph.invoke(session)
-    ai_response = result.get("response", "No response")
-
-    match = re.search(r"chat_history=\[.*?content='(.*?)'\)", ai_response, re.DOTALL)
-    if match:
-        ai = match.group(1).replace("\\n", "\n")
-    else:
-        ai = ai_response
+    # The graph and its agents are blocking; keep them off the event loop
+    result = await asyncio.to_thread(graph.invoke, session)
+    # Nodes put the agent's final answer text in "response"
+    ai = result.get("response") or "No response"
+    # The graph works on a copy of the session; store the (English) reply so
+    # the history holds user/AI pairs, then cap it
+    if message:
+        session.messages.append(AIMessage(content=ai))
+    session.messages = session.messages[-MAX_SESSION_MESSAGES:]
+    session.display_history.append(Turn("ai", ai))
+    del session.display_history[:-MAX_DISPLAY_HISTORY]
 
     # Convert back to original language if needed
     if original_language != "en":
         try:
-            ai = english_to_original_language(ai, original_language)
+            ai = await asyncio.to_thread(english_to_original_language, ai, original_language)
         except Exception as e:
             ai += f"\n\n(Note: Failed to translate back to {original_language}: {e})"
 
-    # Try parsing JSON-like responses
+    # Pure JSON answers (optionally fenced) are rendered as key/value lines
     try:
-        data = json.loads(ai)
+        data = orjson.loads(_json_answer(ai) or ai)
         if isinstance(data, dict):
             formatted = []
             for k, v in data.items():
@@ -148,11 +202,5 @@ async def chat_dynamic(
     except Exception:
         pass
 
-    # Build chat history
-    chat_history = [
-        {"type": "human", "content": m.content} if m.type == "human"
-        else {"type": "ai", "content": m.content}
-        for m in session.messages
-    ]
-
-    return ChatResponse(response=ai.strip(), chat_history=chat_history)
+    # Chat history is maintained incrementally as turns are added
+    return ChatResponse(response=ai.strip(), chat_history=_history_payload(session))
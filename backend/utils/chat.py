@@ -1,8 +1,21 @@
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.messages import AIMessage, HumanMessage
+from functools import lru_cache
+import asyncio
 import time
 
+load_dotenv()
+
+
+@lru_cache(maxsize=8)
+def _get_llm(model, temperature, max_tokens):
+    """
+    Return a shared ChatGroq client for the given settings, so its HTTP
+    clients are built once instead of on every call
+    """
+    return ChatGroq(model=model, temperature=temperature, max_tokens=max_tokens)
+
 
 def invoke_llm_langchain(
     messages, model="llama-3.1-8b-instant", temperature=0.2, max_tokens=5000
@@ -10,8 +23,7 @@ def invoke_llm_langchain(
     """
     Invoke the LLM with the given messages
     """
-    load_dotenv()
-    llm = ChatGroq(model=model, temperature=temperature, max_tokens=max_tokens)
+    llm = _get_llm(model, temperature, max_tokens)
     net_input = 0
     net_output = 0
 
@@ -37,6 +49,107 @@ def invoke_llm_langchain(
     return messages, input_tokens, output_tokens
 
 
+async def ainvoke_llm_langchain(
+    messages, model="llama-3.1-8b-instant", temperature=0.2, max_tokens=5000
+):
+    """
+    Async version of invoke_llm_langchain using the provider's native async
+    client, so many calls can be in flight without tying up threads.
+    """
+    llm = _get_llm(model, temperature, max_tokens)
+
+    try:
+        response = await llm.ainvoke(messages)
+    except Exception:
+        await asyncio.sleep(10)
+        response = await llm.ainvoke(messages)
+
+    try:
+        content = response.content
+        input_tokens = response.usage_metadata["input_tokens"]
+        output_tokens = response.usage_metadata["output_tokens"]
+    except Exception:
+        content = response
+        input_tokens = 0
+        output_tokens = 0
+
+    messages.append(AIMessage(content=content))
+
+    return messages, input_tokens, output_tokens
+
+
+async def abatch_invoke_llm_langchain(message_lists, max_concurrency=10, **kwargs):
+    """
+    Run ainvoke_llm_langchain over several independent conversations
+    concurrently, with at most max_concurrency requests in flight (provider
+    rate limits). Results are returned in input order.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _one(messages):
+        async with semaphore:
+            return await ainvoke_llm_langchain(messages, **kwargs)
+
+    return await asyncio.gather(*(_one(m) for m in message_lists))
+
+
+def stream_llm_langchain(
+    messages, usage=None, model="llama-3.1-8b-instant", temperature=0.2, max_tokens=5000
+):
+    """
+    Stream the LLM response for the given messages, yielding text chunks as they
+    arrive. Once exhausted, the full AIMessage is appended to messages and, if a
+    usage dict is passed, its input_tokens/output_tokens are filled in.
+    """
+    llm = _get_llm(model, temperature, max_tokens)
+
+    full = None
+    for chunk in llm.stream(messages):
+        full = chunk if full is None else full + chunk
+        if chunk.content:
+            yield chunk.content
+
+    content = full.content if full is not None else ""
+    usage_metadata = getattr(full, "usage_metadata", None) or {}
+    if usage is not None:
+        usage["input_tokens"] = usage_metadata.get("input_tokens", 0)
+        usage["output_tokens"] = usage_metadata.get("output_tokens", 0)
+
+    messages.append(AIMessage(content=content))
+
+
+def extract_json(text):
+    """
+    Return the first balanced {...} object in text, or None if there isn't one.
+    Single pass that skips braces inside string literals.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
 # sample usage
 if __name__ == "__main__":
     messages = [
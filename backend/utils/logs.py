@@ -0,0 +1,38 @@
+import atexit
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FILE = "KrishiMitra.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None
+_lock = threading.Lock()
+
+
+def setup_logging(filename: str = LOG_FILE, level: int = logging.INFO) -> None:
+    """
+    Route the root logger through a queue: callers only enqueue records and a
+    background listener thread does the file writes. Safe to call from every
+    module; only the first call configures anything.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        file_handler = logging.FileHandler(filename)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(QueueHandler(log_queue))
+        root.setLevel(level)
+
+        _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        # Flush anything still queued on interpreter exit
+        atexit.register(_listener.stop)
@@ -1,4 +1,8 @@
+import asyncio
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 from dotenv import load_dotenv
 import json
@@ -24,6 +28,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+TILE_WORKERS = 8
+TILE_CONCURRENCY = 16
+TILE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Referer': 'https://maps.google.com/'
+}
+
+# One keep-alive session shared by all download threads: tiles reuse pooled
+# TLS connections to the tile server instead of handshaking per tile
+_SESSION = requests.Session()
+_SESSION.headers.update(TILE_HEADERS)
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.3),
+    ),
+)
+
 def get_google_satellite_tile_urls(lat: float, lon: float, zoom: int = 18, tile_size: int = 3) -> Dict:
     """Generate Google Satellite tile URLs"""
     
@@ -62,12 +86,7 @@ def get_google_satellite_tile_urls(lat: float, lon: float, zoom: int = 18, tile_
 def download_tile(tile_info: Dict, source_name: str) -> Optional[Image.Image]:
     """Download a single tile with appropriate headers"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Referer': 'https://maps.google.com/'
-        }
-        
-        response = requests.get(tile_info['url'], headers=headers, timeout=15)
+        response = _SESSION.get(tile_info['url'], timeout=15)
         response.raise_for_status()
         
         image = Image.open(io.BytesIO(response.content))
@@ -77,6 +96,37 @@ def download_tile(tile_info: Dict, source_name: str) -> Optional[Image.Image]:
         logger.error(f"Failed to download tile from {source_name}: {str(e)}")
         return None
 
+async def _fetch_tile(session: aiohttp.ClientSession, tile_info: Dict, source_name: str) -> Optional[Image.Image]:
+    try:
+        async with session.get(tile_info['url']) as response:
+            response.raise_for_status()
+            return Image.open(io.BytesIO(await response.read()))
+    except Exception as e:
+        logger.error(f"Failed to download tile from {source_name}: {str(e)}")
+        return None
+
+
+async def download_tiles_async(tiles: list, source_name: str) -> list:
+    """Fetch all tiles concurrently on one event loop; results follow tile order"""
+    connector = aiohttp.TCPConnector(limit=TILE_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=15)
+    async with aiohttp.ClientSession(connector=connector, headers=TILE_HEADERS, timeout=timeout) as session:
+        return await asyncio.gather(*(_fetch_tile(session, t, source_name) for t in tiles))
+
+
+def _download_tiles_threaded(tiles: list, source_name: str) -> list:
+    # Concurrency is bounded by the pool size; no per-submit sleep
+    with ThreadPoolExecutor(max_workers=TILE_WORKERS) as executor:
+        futures = [executor.submit(download_tile, tile_info, source_name) for tile_info in tiles]
+        images = []
+        for future in futures:
+            try:
+                images.append(future.result(timeout=20))
+            except Exception:
+                images.append(None)
+    return images
+
+
 def stitch_tiles(tiles: list, tile_size: int) -> Image.Image:
     """Stitch multiple tiles into a single high-resolution image"""
     if not tiles:
@@ -89,7 +139,9 @@ def stitch_tiles(tiles: list, tile_size: int) -> Image.Image:
     total_width = tile_size * tile_width
     total_height = tile_size * tile_height
     
-    stitched = Image.new('RGB', (total_width, total_height))
+    # One contiguous canvas (black where a tile is missing); tiles are blitted
+    # in with slice assignment and wrapped as an image once at the end
+    canvas = np.zeros((total_height, total_width, 3), dtype=np.uint8)
     
     valid_tiles = 0
     for tile_info in tiles:
@@ -98,13 +150,14 @@ def stitch_tiles(tiles: list, tile_size: int) -> Image.Image:
             x_offset = (dx + tile_size//2) * tile_width
             y_offset = (dy + tile_size//2) * tile_height
             
-            stitched.paste(tile_info['image'], (x_offset, y_offset))
+            tile = np.asarray(tile_info['image'].convert('RGB'))[:tile_height, :tile_width]
+            canvas[y_offset:y_offset + tile.shape[0], x_offset:x_offset + tile.shape[1]] = tile
             valid_tiles += 1
     
     if valid_tiles == 0:
         return None
     
-    return stitched
+    return Image.fromarray(canvas)
 
 def get_google_satellite_imagery(lat: float, lon: float, zoom: int = 19, tile_grid: int = 5) -> Optional[Image.Image]:
     """Get high resolution satellite imagery using Google Satellite only"""
@@ -120,26 +173,21 @@ def get_google_satellite_imagery(lat: float, lon: float, zoom: int = 19, tile_gr
     logger.info(f"Processing {source_name} ({source_info['description']})")
     tiles = source_info['tiles']
     
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        images = asyncio.run(download_tiles_async(tiles, source_name))
+    else:
+        # Already inside an event loop (asyncio.run would fail): use threads
+        images = _download_tiles_threaded(tiles, source_name)
+
     downloaded_tiles = []
-    
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = []
-        for i, tile_info in enumerate(tiles):
-            time.sleep(0.1)
-            future = executor.submit(download_tile, tile_info, source_name)
-            futures.append((future, tile_info))
-        
-        # Collect results
-        successful_downloads = 0
-        for future, tile_info in futures:
-            try:
-                image = future.result(timeout=20)
-                tile_info['image'] = image
-                if image:
-                    successful_downloads += 1
-            except Exception as e:
-                tile_info['image'] = None
-            downloaded_tiles.append(tile_info)
+    successful_downloads = 0
+    for tile_info, image in zip(tiles, images):
+        tile_info['image'] = image
+        if image:
+            successful_downloads += 1
+        downloaded_tiles.append(tile_info)
     
     logger.info(f"Downloaded {successful_downloads}/{len(tiles)} tiles")
     
@@ -157,17 +205,14 @@ def get_google_satellite_imagery(lat: float, lon: float, zoom: int = 19, tile_gr
     
     return None
 
+_ENHANCE_LUT = np.clip(np.arange(256) * 1.1, 0, 255).astype(np.uint8).tolist()
+
 def enhance_image_quality(image: Image.Image) -> Image.Image:
     """Apply basic image enhancement to improve quality"""
     try:
-        # Convert to numpy array for processing
-        img_array = np.array(image)
-        
-        # Apply slight contrast enhancement
-        enhanced = np.clip(img_array * 1.1, 0, 255).astype(np.uint8)
-        
-        # Convert back to PIL Image
-        enhanced_image = Image.fromarray(enhanced)
+        # Apply slight contrast enhancement through a per-band lookup table
+        # (same values as clip(x * 1.1) without a float64 copy of the image)
+        enhanced_image = image.point(_ENHANCE_LUT * len(image.getbands()))
         
         return enhanced_image
     except:
@@ -114,10 +114,9 @@ def text_to_speech_elevenlabs(
             voice_id=voice_id,
             model_id=model_id,
         )
-        with open(filename, "wb") as f:
-            for chunk in audio_stream:
-                if isinstance(chunk, bytes):
-                    f.write(chunk)
+        # 1 MiB buffer: many small stream chunks become a few large write() calls
+        with open(filename, "wb", buffering=1 << 20) as f:
+            f.writelines(c for c in audio_stream if isinstance(c, bytes))
         return filename
     except Exception as e:
         print(f"[ERROR] ElevenLabs TTS failed: {e}")
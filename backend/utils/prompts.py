@@ -0,0 +1,20 @@
+import os
+from functools import lru_cache
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _Loader
+
+PROMPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.yaml")
+
+
+@lru_cache(maxsize=1)
+def get_prompts():
+    """
+    Load utils/prompts.yaml once per process (C loader when available).
+    """
+    with open(PROMPTS_PATH, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_Loader)
@@ -1,21 +1,41 @@
 import os
+import asyncio
 import base64
 import json
 import requests
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 API_KEY = os.getenv("MOONDREAM_API_KEY")
 QUERY_URL = "https://api.moondream.ai/v1/query"
 
-def ask_vlm(image_path: str, question: str) -> str:
+# Shared async client so concurrent VLM calls reuse pooled connections
+_ASYNC_CLIENT = httpx.AsyncClient(timeout=60)
+
+
+# Multiple of 3 so each chunk base64-encodes without padding
+_B64_CHUNK = 3 * 16 * 1024
+
+
+def _image_data_uri(image_path: str) -> str:
+    """
+    Base64 data URI for the image, encoded chunk by chunk so the raw file and
+    its encoding are never both held in memory in full.
+    """
+    buf = bytearray(b"data:image/png;base64,")
+    with open(image_path, "rb") as f:
+        while chunk := f.read(_B64_CHUNK):
+            buf += base64.b64encode(chunk)
+    return buf.decode("ascii")
+
+
+def _build_request(image_path: str, question: str):
     if not API_KEY:
         raise ValueError("Missing MOONDREAM_API_KEY in environment")
 
-    with open(image_path, "rb") as f:
-        img_bytes = f.read()
-    b64 = base64.b64encode(img_bytes).decode("utf-8")
-    data_uri = f"data:image/png;base64,{b64}"
+    # The query endpoint only accepts images as a data URI (no multipart)
+    data_uri = _image_data_uri(image_path)
 
     payload = {
         "image_url": data_uri,
@@ -27,11 +47,26 @@ def ask_vlm(image_path: str, question: str) -> str:
         "X-Moondream-Auth": API_KEY,
         "Content-Type": "application/json"
     }
+    return headers, payload
+
 
+def ask_vlm(image_path: str, question: str) -> str:
+    headers, payload = _build_request(image_path, question)
     resp = requests.post(QUERY_URL, headers=headers, json=payload)
     resp.raise_for_status()
     return resp.json().get("answer")
 
+
+async def ask_vlm_async(image_path: str, question: str) -> str:
+    """
+    Same as ask_vlm, without blocking the event loop: the file read and
+    base64 encode run in a worker thread, the HTTP call is async.
+    """
+    headers, payload = await asyncio.to_thread(_build_request, image_path, question)
+    resp = await _ASYNC_CLIENT.post(QUERY_URL, headers=headers, json=payload)
+    resp.raise_for_status()
+    return resp.json().get("answer")
+
 if __name__ == "__main__":
     path = "/Users/naba/Desktop/freelance/data/material_issue_data/issue/4.png"
     prompt = "What objects are in this image, and what are they doing?"
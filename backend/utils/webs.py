@@ -1,8 +1,73 @@
+from functools import lru_cache
 from langchain_community.tools import TavilySearchResults
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def truncate_tokens(text, max_tokens):
+    """Truncate text to at most max_tokens cl100k tokens (~4 chars/token if tiktoken is unavailable)."""
+    try:
+        enc = _get_encoding()
+    except Exception:
+        return text[: max_tokens * 4]
+    tokens = enc.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def compress_results(results, top_k=5, max_tokens=1500):
+    """
+    Turn Tavily results into a compact prompt context: keep the top_k ranked
+    snippets, drop repeated URLs/snippets, and cap the total by token count.
+    """
+    if not isinstance(results, list):
+        results = [results]
+    # Highest Tavily relevance score first (stable, so unscored results keep their order)
+    results = sorted(
+        results,
+        key=lambda r: (r.get("score") or 0) if isinstance(r, dict) else 0,
+        reverse=True,
+    )
+
+    seen = set()
+    snippets = []
+    for r in results:
+        if isinstance(r, dict):
+            key = r.get("url") or r.get("content")
+            snippet = f"{r.get('title') or r.get('url', '')}\n{r.get('content', '')}".strip()
+        else:
+            key = snippet = str(r)
+        if not snippet or key in seen:
+            continue
+        seen.add(key)
+        snippets.append(snippet)
+        if len(snippets) == top_k:
+            break
+
+    return truncate_tokens("\n\n---\n\n".join(snippets), max_tokens)
+
+
+@lru_cache(maxsize=8)
+def _get_tool(max_results, search_depth, include_answer, include_raw_content, include_images):
+    """Shared TavilySearchResults per settings, so its HTTP client stays warm."""
+    return TavilySearchResults(
+        max_results=max_results,
+        search_depth=search_depth,
+        include_answer=include_answer,
+        include_raw_content=include_raw_content,
+        include_images=include_images,
+    )
+
+
 class TavilySearchTool:
     def __init__(
         self,
@@ -12,12 +77,8 @@ class TavilySearchTool:
         include_raw_content=True,
         include_images=True,
     ):
-        self.tool = TavilySearchResults(
-            max_results=max_results,
-            search_depth=search_depth,
-            include_answer=include_answer,
-            include_raw_content=include_raw_content,
-            include_images=include_images,
+        self.tool = _get_tool(
+            max_results, search_depth, include_answer, include_raw_content, include_images
         )
 
     def invoke_tool(
@@ -30,3 +91,7 @@ class TavilySearchTool:
             "type": tool_type,
         }
         return self.tool.invoke(model_generated_tool_call)
+
+    def search(self, query):
+        """Run a search and return the plain list of result dicts."""
+        return self.tool.invoke({"query": query})